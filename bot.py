@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Optional
+
+import environ
+import httpx
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+BOT_URL = env('BOT_URL')
+BOT_TIMEOUT = env.float('BOT_TIMEOUT', default=5.0)
+BOT_MAX_CONNECTIONS = env.int('BOT_MAX_CONNECTIONS', default=10)
+BOT_STATUS_INTERVAL = env.float('BOT_STATUS_INTERVAL', default=10.0)
+BOT_STATUS_TIMEOUT = env.float('BOT_STATUS_TIMEOUT', default=2.0)
+
+client: Optional[httpx.AsyncClient] = None
+
+online = False
+checked_at: Optional[float] = None
+_prober: Optional[asyncio.Task] = None
+
+
+async def start():
+    """
+    Opens the shared keep-alive client used for all requests to the Bot
+    and starts refreshing the Bot status in the background.
+    """
+    global client, _prober
+    client = httpx.AsyncClient(
+        base_url=BOT_URL,
+        timeout=httpx.Timeout(BOT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=BOT_MAX_CONNECTIONS,
+            max_keepalive_connections=BOT_MAX_CONNECTIONS,
+        ),
+    )
+    _prober = asyncio.create_task(_probe_forever())
+
+
+async def stop():
+    global client, _prober
+    if _prober is not None:
+        _prober.cancel()
+        try:
+            await _prober
+        except asyncio.CancelledError:
+            pass
+        _prober = None
+    if client is not None:
+        await client.aclose()
+        client = None
+
+
+async def request(method: str, path: str, payload: dict = None):
+    response = await client.request(method, path, json=payload)
+    response.raise_for_status()
+    return response
+
+
+async def probe():
+    """
+    Refreshes the cached Bot status. Any response counts as the Bot being
+    online, only connection errors and timeouts count as offline.
+    """
+    global online, checked_at
+    try:
+        await client.get('/status', timeout=BOT_STATUS_TIMEOUT)
+        online = True
+    except httpx.HTTPError:
+        online = False
+    checked_at = time.monotonic()
+
+
+async def _probe_forever():
+    while True:
+        await probe()
+        await asyncio.sleep(BOT_STATUS_INTERVAL)
+
+
+def status_age() -> Optional[float]:
+    """
+    Seconds since the cached Bot status was last refreshed.
+    """
+    if checked_at is None:
+        return None
+    return time.monotonic() - checked_at
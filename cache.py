@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+
+import environ
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+PRINCIPAL_CACHE_SIZE = env.int('PRINCIPAL_CACHE_SIZE', default=1024)
+PRINCIPAL_CACHE_TTL = env.float('PRINCIPAL_CACHE_TTL', default=60.0)
+TOKEN_VERSION_CACHE_TTL = env.float('TOKEN_VERSION_CACHE_TTL', default=5.0)
+DB_REPLICA_PIN_TTL = env.float('DB_REPLICA_PIN_TTL', default=5.0)
+RESOURCE_VERSION_CACHE_TTL = env.float(
+    'RESOURCE_VERSION_CACHE_TTL', default=2.0
+)
+RESPONSE_CACHE_SIZE = env.int('RESPONSE_CACHE_SIZE', default=64)
+RESPONSE_CACHE_TTL = env.float('RESPONSE_CACHE_TTL', default=600.0)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with at most `maxsize` entries, each of which
+    expires `ttl` seconds after it was set.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Users resolved by get_current_user, keyed by the lowercase token subject.
+# The cached instances are detached from any Session.
+principals = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+# Current token version of each User id, checked against the `ver` claim.
+token_versions = TTLCache(PRINCIPAL_CACHE_SIZE, TOKEN_VERSION_CACHE_TTL)
+
+# User ids that wrote recently. Their reads go to the primary until the
+# replica had time to catch up with their own changes.
+replica_pins = TTLCache(PRINCIPAL_CACHE_SIZE, DB_REPLICA_PIN_TTL)
+
+# Version of each resource key, by the DB it was read from, see etags.py.
+# Writes drop their keys right after the commit in this process, and when
+# their notification arrives in the other workers, see changes.py. Until
+# then the entry expires.
+resource_versions = TTLCache(PRINCIPAL_CACHE_SIZE, RESOURCE_VERSION_CACHE_TTL)
+
+# Serialized responses of the reference data routes with the ETag they were
+# built for, see response_cache.py.
+responses = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
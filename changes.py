@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from typing import Callable, Optional
+
+import asyncpg
+import environ
+import orjson
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+import cache
+import database
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+CHANGES_ENABLED = env.bool('CHANGES_ENABLED', default=True)
+CHANGES_CHANNEL = env('CHANGES_CHANNEL', default='changes')
+CHANGES_PING_INTERVAL = env.float('CHANGES_PING_INTERVAL', default=30.0)
+CHANGES_RECONNECT_DELAY = env.float('CHANGES_RECONNECT_DELAY', default=1.0)
+CHANGES_RECONNECT_MAX = env.float('CHANGES_RECONNECT_MAX', default=60.0)
+
+# Postgres refuses NOTIFY payloads of 8000 bytes or more.
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+# Sent with every notification, so a worker skips its own. Those were
+# already applied when their transaction committed.
+WORKER_ID = uuid.uuid4().hex
+
+# Kinds of changes of the caches in cache.py, with the keys to drop.
+PRINCIPALS = 'principals'
+TOKEN_VERSIONS = 'token_versions'
+# User ids to read from the primary for a while, see dependencies.py.
+REPLICA_PINS = 'replica_pins'
+
+_handlers = defaultdict(list)
+_resets = []
+_shrinkers = {}
+_task: Optional[asyncio.Task] = None
+
+logger = logging.getLogger(__name__)
+
+
+def register(kind: str, handler: Callable[[list], None],
+             reset: Optional[Callable[[], None]] = None,
+             shrink: Optional[Callable] = None):
+    """
+    Registers a handler for the values of a kind of change. It is called in
+    the worker that made the change once the transaction commits, and in
+    every other worker when the notification arrives, on the event loop.
+    `reset` is called instead when a worker may have missed notifications.
+    `shrink` replaces a value that does not fit in a notification.
+    """
+    _handlers[kind].append(handler)
+    if reset is not None:
+        _resets.append(reset)
+    if shrink is not None:
+        _shrinkers[kind] = shrink
+
+
+def emit(db: Session, kind: str, *values):
+    """
+    Adds values to the changes of the transaction. They are sent with a
+    NOTIFY in the same transaction, so they are dropped on a rollback.
+    The values have to be JSON serializable.
+    """
+    staged = db.info.setdefault('changes', {}).setdefault(kind, [])
+    for value in values:
+        if value not in staged:
+            staged.append(value)
+
+
+async def broadcast(kind: str, *values):
+    """
+    Applies the values in this worker and sends them to the others right
+    away, outside of the transaction of any change.
+    """
+    changes = {kind: list(values)}
+    apply(changes)
+    if not CHANGES_ENABLED:
+        return
+    async with database.AsyncSessionLocal() as db:
+        for payload in notifications(changes):
+            await db.execute(
+                select(func.pg_notify(CHANGES_CHANNEL, payload.decode()))
+            )
+        await db.commit()
+
+
+def apply(changes: dict):
+    for kind, values in changes.items():
+        for handler in _handlers.get(kind, ()):
+            handler(values)
+
+
+def reset():
+    for reset_ in _resets:
+        reset_()
+
+
+def _encode(changes: dict) -> bytes:
+    return orjson.dumps({'origin': WORKER_ID, 'changes': changes})
+
+
+def notifications(changes: dict):
+    """
+    Returns the payloads of the notifications for the changes. Changes
+    that are too large together are sent one value at a time.
+    """
+    payload = _encode(changes)
+    if len(payload) < NOTIFY_PAYLOAD_LIMIT:
+        return [payload]
+    payloads = []
+    for kind, values in changes.items():
+        for value in values:
+            payload = _encode({kind: [value]})
+            if len(payload) >= NOTIFY_PAYLOAD_LIMIT and kind in _shrinkers:
+                payload = _encode({kind: [_shrinkers[kind](value)]})
+            # Without a shrinker the other workers see the change once
+            # their cache entries expire.
+            if len(payload) < NOTIFY_PAYLOAD_LIMIT:
+                payloads.append(payload)
+    return payloads
+
+
+@event.listens_for(Session, 'before_commit')
+def _notify(session):
+    changes = session.info.get('changes')
+    if not changes or not CHANGES_ENABLED:
+        return
+    for payload in notifications(changes):
+        session.execute(
+            select(func.pg_notify(CHANGES_CHANNEL, payload.decode()))
+        )
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed(session):
+    changes = session.info.pop('changes', None)
+    if changes:
+        apply(changes)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard(session, previous_transaction):
+    session.info.pop('changes', None)
+
+
+def _on_notification(connection, pid, channel, payload):
+    message = orjson.loads(payload)
+    if message['origin'] != WORKER_ID:
+        apply(message['changes'])
+
+
+async def _listen():
+    """
+    Keeps one LISTEN connection to the primary, outside of the pools, and
+    reconnects when it is lost, waiting twice as long after every failed
+    attempt.
+    """
+    delay = CHANGES_RECONNECT_DELAY
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(database.url)
+            await connection.add_listener(CHANGES_CHANNEL, _on_notification)
+            # Changes made while nobody listened on this worker are lost.
+            reset()
+            delay = CHANGES_RECONNECT_DELAY
+            while True:
+                await asyncio.sleep(CHANGES_PING_INTERVAL)
+                # Notices a dead connection, which a LISTEN alone does not.
+                await connection.execute('SELECT 1')
+        except Exception:  # pylint: disable=broad-except
+            logger.exception(
+                'Listening for changes failed, reconnecting in %.1fs', delay
+            )
+        finally:
+            if connection is not None:
+                connection.terminate()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, CHANGES_RECONNECT_MAX)
+
+
+def _invalidate(ttl_cache: cache.TTLCache):
+    def handler(keys: list):
+        for key in keys:
+            ttl_cache.invalidate(key)
+    return handler
+
+
+def _pin(user_ids: list):
+    for user_id in user_ids:
+        cache.replica_pins.set(user_id, True)
+
+
+register(PRINCIPALS, _invalidate(cache.principals),
+         reset=cache.principals.clear)
+register(TOKEN_VERSIONS, _invalidate(cache.token_versions),
+         reset=cache.token_versions.clear)
+register(REPLICA_PINS, _pin)
+
+
+async def start():
+    global _task
+    if CHANGES_ENABLED:
+        _task = asyncio.create_task(_listen())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
@@ -0,0 +1,172 @@
+import zlib
+
+import brotli
+import environ
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+COMPRESSION_MIN_SIZE = env.int('COMPRESSION_MIN_SIZE', default=1024)
+GZIP_LEVEL = env.int('GZIP_LEVEL', default=6)
+BROTLI_QUALITY = env.int('BROTLI_QUALITY', default=4)
+
+# Preferred first when the client accepts several with the same weight.
+ENCODINGS = ('br', 'gzip')
+
+
+def negotiate(accept_encoding: str):
+    """
+    Picks the encoding for an Accept-Encoding header, or None when the
+    client accepts none of ENCODINGS.
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding.strip().lower()] = weight
+    default = weights.get('*', 0.0)
+    best, best_weight = None, 0.0
+    for coding in ENCODINGS:
+        weight = weights.get(coding, default)
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class GzipCompressor:
+    def __init__(self):
+        # wbits=31 writes the gzip header and trailer.
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) \
+            + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+COMPRESSORS = {
+    'br': BrotliCompressor,
+    'gzip': GzipCompressor,
+}
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes with the best
+    encoding the client accepts. Streamed responses are compressed chunk by
+    chunk, and every chunk is flushed so the client gets it right away.
+    A route opts out by sending `Cache-Control: no-transform`.
+    """
+
+    def __init__(self, app: ASGIApp,
+                 minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'http':
+            encoding = negotiate(
+                Headers(scope=scope).get('Accept-Encoding', '')
+            )
+            if encoding is not None:
+                responder = CompressionResponder(
+                    self.app, self.minimum_size, encoding
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app: ASGIApp, minimum_size: int, encoding: str):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoding = encoding
+        self.send = None
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _skip(self, headers: Headers):
+        return self.start_message['status'] in (204, 304) \
+            or 'content-encoding' in headers \
+            or 'no-transform' in headers.get('cache-control', '').lower()
+
+    def _start_compressing(self):
+        headers = MutableHeaders(raw=self.start_message['headers'])
+        headers['Content-Encoding'] = self.encoding
+        headers.add_vary_header('Accept-Encoding')
+        # The compressed bytes are a different representation, so a strong
+        # ETag becomes a weak one. etags.not_modified accepts both.
+        etag = headers.get('etag')
+        if etag is not None and not etag.startswith('W/'):
+            headers['ETag'] = f'W/{etag}'
+        self.compressor = COMPRESSORS[self.encoding]()
+        return headers
+
+    async def send_compressed(self, message: Message):
+        if message['type'] == 'http.response.start':
+            # Sent together with the first body, once it is known whether
+            # the response gets compressed.
+            self.start_message = message
+            self.passthrough = self._skip(Headers(raw=message['headers']))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if self.passthrough or message['type'] != 'http.response.body':
+            await self.send(message)
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        if self.compressor is None:
+            if len(body) < self.minimum_size and not more_body:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            headers = self._start_compressing()
+            if more_body:
+                del headers['Content-Length']
+            else:
+                body = self.compressor.finish(body)
+                headers['Content-Length'] = str(len(body))
+                await self.send(self.start_message)
+                await self.send({**message, 'body': body})
+                return
+            await self.send(self.start_message)
+
+        if more_body:
+            body = self.compressor.compress(body)
+        else:
+            body = self.compressor.finish(body)
+        await self.send({**message, 'body': body})
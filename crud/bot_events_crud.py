@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+# Key of the advisory lock held by a claim until it commits.
+OUTBOX_CLAIM_LOCK_ID = 7022
+
+
+def add_bot_event(
+        db: Session, guild_id: str, method: str, path: str, payload: dict
+):
+    # No commit here, the event is stored in the transaction of the change
+    # that caused it.
+    db.add(models.BotEvent(
+        guild_id=guild_id,
+        method=method,
+        path=path,
+        payload=payload
+    ))
+
+
+def claim_bot_events(db: Session, limit: int, lease: timedelta):
+    """
+    Claims the due events of the guilds whose older events are all due
+    too. A guild waits while its oldest event is leased or in backoff, so
+    its events are always sent in order.
+    """
+    now = datetime.now()
+    # Claims are serialized, otherwise a concurrent claim could see the
+    # older events of a guild as due before their lease is committed.
+    db.execute(select(func.pg_advisory_xact_lock(OUTBOX_CLAIM_LOCK_ID)))
+    older = aliased(models.BotEvent)
+    events = db.query(models.BotEvent) \
+        .filter(models.BotEvent.next_attempt_at <= now) \
+        .filter(~exists().where(
+            older.guild_id == models.BotEvent.guild_id,
+            older.id < models.BotEvent.id,
+            older.next_attempt_at > now,
+        )) \
+        .order_by(models.BotEvent.id) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True) \
+        .all()
+    for event in events:
+        event.next_attempt_at = now + lease
+    db.commit()
+    return events
+
+
+def delete_bot_events(db: Session, event_ids: List[int]):
+    if not event_ids:
+        return
+    db.query(models.BotEvent) \
+        .filter(models.BotEvent.id.in_(event_ids)) \
+        .delete(synchronize_session=False)
+    db.commit()
+
+
+def reschedule_bot_events(
+        db: Session, failed_id: Optional[int], event_ids: List[int],
+        next_attempt_at: datetime
+):
+    """
+    Counts an attempt for the event that was sent and failed, if any, and
+    moves the events to the next attempt.
+    """
+    if failed_id is not None:
+        db.query(models.BotEvent) \
+            .filter(models.BotEvent.id == failed_id) \
+            .update({models.BotEvent.attempts: models.BotEvent.attempts + 1},
+                    synchronize_session=False)
+    if event_ids:
+        db.query(models.BotEvent) \
+            .filter(models.BotEvent.id.in_(event_ids)) \
+            .update({models.BotEvent.next_attempt_at: next_attempt_at},
+                    synchronize_session=False)
+    db.commit()
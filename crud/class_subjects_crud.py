@@ -1,6 +1,15 @@
 from sqlalchemy.orm import Session
 
+from crud import bot_events_crud, loading
+import etags
 import models
+import schemas
+
+
+def get_class_subjects(db: Session, class_: models.Class):
+    query = db.query(models.ClassSubject) \
+        .filter(models.ClassSubject.class_id == class_.id)
+    return loading.load_for(query, schemas.ClassSubjectsWithUser).all()
 
 
 def add_subject_to_class(
@@ -8,6 +17,14 @@ def add_subject_to_class(
         subject: models.Subject
 ):
     class_.subjects.append(subject)
+    if class_.guild_id is not None:
+        bot_events_crud.add_bot_event(
+            db, class_.guild_id, 'POST', '/subjects', {
+                'guild_id': class_.guild_id,
+                'subject': subject.name,
+            }
+        )
+    etags.bump(db, etags.CLASS_SUBJECTS)
     db.commit()
     db.refresh(class_)
 
@@ -17,5 +34,13 @@ def remove_subject_from_class(
         subject: models.Subject
 ):
     class_.subjects.remove(subject)
+    if class_.guild_id is not None:
+        bot_events_crud.add_bot_event(
+            db, class_.guild_id, 'DELETE', '/subjects', {
+                'guild_id': class_.guild_id,
+                'subject': subject.name,
+            }
+        )
+    etags.bump(db, etags.CLASS_SUBJECTS)
     db.commit()
     db.refresh(class_)
@@ -1,11 +1,28 @@
+import secrets
+import threading
 from typing import Optional
 
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 
+from crud import bot_events_crud, loading
+import changes
+import etags
 import models
 import schemas
 
+# Number of Classes with a Discord server, counted on demand and forgotten
+# in every worker when a guild_id is set or removed. The generation changes
+# with every forget, so a count that was running meanwhile is not stored.
+_initialized_classes_count: Optional[int] = None
+_initialized_classes_generation = 0
+_initialized_classes_lock = threading.Lock()
+INITIALIZED_CLASSES = 'initialized_classes'
+
+# 32 random bytes encode to 43 URL-safe characters, within Class.key.
+CLASS_KEY_BYTES = 32
+
 
 def get_class_by_name(db: Session, name: str):
     return db.query(models.Class).filter(models.Class.name == name).first()
@@ -20,32 +37,78 @@ def get_class_by_guild_id(db: Session, guild_id: str):
         filter(models.Class.guild_id == guild_id).first()
 
 
-def get_all_classes(db: Session):
-    return db.query(models.Class).order_by(models.Class.name).all()
+async def get_class_by_name_async(db: AsyncSession, name: str):
+    statement = select(models.Class).where(models.Class.name == name)
+    result = await db.execute(
+        loading.load_for(statement, schemas.ClassWithUser)
+    )
+    return result.scalars().first()
 
 
-def get_initialized_classes_count(db: Session):
-    return len(
-        db.query(models.Class).filter(models.Class.guild_id is not None).all()
+async def get_all_classes_async(db: AsyncSession):
+    statement = select(models.Class).order_by(models.Class.name)
+    result = await db.execute(
+        loading.load_for(statement, schemas.ClassWithUser)
     )
+    return result.scalars().all()
+
+
+def get_initialized_classes_count(db: Session):
+    global _initialized_classes_count
+    with _initialized_classes_lock:
+        count = _initialized_classes_count
+        generation = _initialized_classes_generation
+    if count is None:
+        count = db.query(func.count(models.Class.id)) \
+            .filter(models.Class.guild_id.isnot(None)).scalar()
+        with _initialized_classes_lock:
+            if generation == _initialized_classes_generation:
+                _initialized_classes_count = count
+    return count
+
+
+def _forget_initialized_classes_count(values: list = None):
+    global _initialized_classes_count, _initialized_classes_generation
+    with _initialized_classes_lock:
+        _initialized_classes_count = None
+        _initialized_classes_generation += 1
+
+
+changes.register(INITIALIZED_CLASSES, _forget_initialized_classes_count,
+                 reset=_forget_initialized_classes_count)
+
+
+def generate_class_key():
+    return secrets.token_urlsafe(CLASS_KEY_BYTES)
 
 
 def create_class(db: Session, class_: schemas.ClassCreate):
     db_class = models.Class(
         name=class_.name,
-        key=CryptContext(schemes=["bcrypt"]).hash(class_.name)
+        key=generate_class_key()
     )
     db.add(db_class)
+    etags.bump(db, etags.CLASSES)
     db.commit()
     db.refresh(db_class)
 
 
+def rotate_class_keys(db: Session):
+    class_ids = [class_id for class_id, in db.query(models.Class.id)]
+    db.bulk_update_mappings(models.Class, [
+        {'id': class_id, 'key': generate_class_key()}
+        for class_id in class_ids
+    ])
+    db.commit()
+
+
 def edit_class(
         db: Session,
         class_: models.Class,
         new_class: schemas.ClassCreate
 ):
     class_.name = new_class.name
+    etags.bump(db, etags.CLASSES)
     db.commit()
     db.refresh(class_)
 
@@ -54,12 +117,22 @@ def set_class_guild_id(
         db: Session, class_: models.Class,
         guild_id: str = None
 ):
+    if (class_.guild_id is None) != (guild_id is None):
+        changes.emit(db, INITIALIZED_CLASSES, True)
     class_.guild_id = guild_id
+    etags.bump(db, etags.CLASSES)
     db.commit()
 
 
 def delete_class(db: Session, class_: models.Class):
+    if class_.guild_id is not None:
+        bot_events_crud.add_bot_event(
+            db, class_.guild_id, 'DELETE', '/classes',
+            {'guild_id': class_.guild_id}
+        )
+        changes.emit(db, INITIALIZED_CLASSES, True)
     db.delete(class_)
+    etags.bump(db, etags.CLASSES, etags.CLASS_SUBJECTS)
     db.commit()
 
 
@@ -68,6 +141,7 @@ def set_class_subject_teacher(
         user: Optional[models.User] = None
 ):
     class_subject.teacher = user
+    etags.bump(db, etags.CLASS_SUBJECTS)
     db.commit()
     db.refresh(class_subject)
 
@@ -75,6 +149,8 @@ def set_class_subject_teacher(
 def set_class_teacher(db: Session, class_: models.Class, user: models.User):
     class_.class_teacher = user
     user.class_ = class_
+    etags.bump(db, etags.CLASSES, etags.USERS)
+    changes.emit(db, changes.PRINCIPALS, user.email.lower())
     db.commit()
     db.refresh(class_)
     db.refresh(user)
@@ -86,5 +162,8 @@ def remove_class_teacher(db: Session, class_: models.Class):
         user.class_ = None
         db.refresh(user)
     class_.class_teacher = None
+    etags.bump(db, etags.CLASSES, etags.USERS)
+    if user is not None:
+        changes.emit(db, changes.PRINCIPALS, user.email.lower())
     db.commit()
     db.refresh(class_)
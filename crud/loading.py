@@ -0,0 +1,29 @@
+from sqlalchemy.orm import joinedload, selectinload
+
+import models
+import schemas
+
+# Relationships read by each response schema. Loading them together with
+# the rows keeps the number of queries for a list independent of its size.
+PROFILES = {
+    schemas.ClassWithUser: (
+        joinedload(models.Class.class_teacher),
+    ),
+    schemas.UserWithClass: (
+        joinedload(models.User.class_),
+    ),
+    schemas.UserWithClasses: (
+        selectinload(models.User.classes),
+    ),
+    schemas.ClassSubjectsWithUser: (
+        joinedload(models.ClassSubject.subject),
+        joinedload(models.ClassSubject.teacher),
+    ),
+    schemas.MessageWithUser: (
+        joinedload(models.Message.user),
+    ),
+}
+
+
+def load_for(query, schema):
+    return query.options(*PROFILES[schema])
@@ -1,7 +1,16 @@
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import AsyncIterator, Iterator, Optional, Tuple
 
+from sqlalchemy import and_, func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from crud import bot_events_crud, loading
+import etags
+import feeds
 import models
 import schemas
+import serializers
 
 
 def get_message_by_id(db: Session, message_id: int):
@@ -9,21 +18,233 @@ def get_message_by_id(db: Session, message_id: int):
         .filter(models.Message.id == message_id).first()
 
 
+async def get_class_subject_messages_async(
+        db: AsyncSession, class_subject: models.ClassSubject, limit: int,
+        before: Optional[Tuple[datetime, int]] = None
+):
+    """
+    Returns a page of Messages, newest first. `before` is the
+    (created_at, id) of the last Message of the previous page.
+    """
+    statement = select(models.Message) \
+        .where(models.Message.class_subject_id == class_subject.id)
+    if before is not None:
+        statement = statement.where(
+            tuple_(models.Message.created_at, models.Message.id)
+            < tuple_(*before)
+        )
+    statement = statement \
+        .order_by(models.Message.created_at.desc(), models.Message.id.desc()) \
+        .limit(limit)
+    result = await db.execute(
+        loading.load_for(statement, schemas.MessageWithUser)
+    )
+    return result.scalars().all()
+
+
+def _export_statement(
+        batch_size: int,
+        class_name: Optional[str] = None,
+        subject_name: Optional[str] = None,
+        teacher: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+):
+    teacher_user = aliased(models.User)
+    author = aliased(models.User)
+    statement = select(
+        models.Message.id,
+        models.Message.created_at,
+        models.Class.name.label('class_name'),
+        models.Subject.name.label('subject_name'),
+        teacher_user.email.label('teacher'),
+        author.email.label('author'),
+        models.Message.title,
+        models.Message.text,
+    ) \
+        .join(models.ClassSubject,
+              models.ClassSubject.id == models.Message.class_subject_id) \
+        .join(models.Class, models.Class.id == models.ClassSubject.class_id) \
+        .join(models.Subject,
+              models.Subject.id == models.ClassSubject.subject_id) \
+        .outerjoin(teacher_user,
+                   teacher_user.id == models.ClassSubject.user_id) \
+        .join(author, author.id == models.Message.user_id)
+    if class_name is not None:
+        statement = statement.where(models.Class.name == class_name)
+    if subject_name is not None:
+        statement = statement.where(models.Subject.name == subject_name)
+    if teacher is not None:
+        statement = statement.where(
+            func.lower(teacher_user.email) == teacher.lower()
+        )
+    if since is not None:
+        statement = statement.where(models.Message.created_at >= since)
+    if until is not None:
+        statement = statement.where(models.Message.created_at < until)
+    statement = statement \
+        .order_by(models.Message.class_subject_id,
+                  models.Message.created_at, models.Message.id) \
+        .execution_options(max_row_buffer=batch_size)
+    return statement
+
+
+async def stream_messages_async(
+        db: AsyncSession, batch_size: int, **filters
+) -> AsyncIterator[list]:
+    """
+    Yields the Messages matching the filters of _export_statement as flat
+    rows, `batch_size` rows at a time, read through a server-side cursor.
+    Rows are ordered by Class Subject and then by time, which follows the
+    message index.
+    """
+    result = await db.stream(_export_statement(batch_size, **filters))
+    async for rows in result.partitions(batch_size):
+        yield rows
+
+
+def stream_messages(db: Session, batch_size: int, **filters) -> Iterator[list]:
+    result = db.execute(
+        _export_statement(batch_size, **filters)
+        .execution_options(stream_results=True)
+    )
+    yield from result.partitions(batch_size)
+
+
+# Shorter fragments around the matches than the ts_headline defaults.
+HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, ' \
+                   'MaxWords=35, MinWords=15, MaxFragments=2'
+
+# The text is written by Users, so it is HTML-escaped before ts_headline
+# adds the <mark> tags. '&' goes first, so the entities stay intact.
+HTML_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'),
+                ('"', '&quot;'), ("'", '&#x27;'))
+
+
+def _html_escape(column):
+    for character, entity in HTML_ESCAPES:
+        column = func.replace(column, character, entity)
+    return column
+
+
+async def search_messages_async(
+        db: AsyncSession, query: str, limit: int, offset: int,
+        teacher_id: Optional[int] = None,
+        class_name: Optional[str] = None,
+        subject_name: Optional[str] = None
+):
+    """
+    Returns a page of the Messages matching a web-search style query, best
+    match first. `teacher_id` limits the search to the Class Subjects that
+    User teaches. The headlines are only made for the rows of the page.
+    """
+    config = literal_column(f"'{models.SEARCH_CONFIG}'::regconfig")
+    tsquery = func.websearch_to_tsquery(config, query)
+    rank = func.ts_rank_cd(models.Message.search_vector, tsquery)
+    
+    page = select(models.Message.id, models.Message.created_at,
+                  rank.label('rank')) \
+        .join(models.ClassSubject,
+              models.ClassSubject.id == models.Message.class_subject_id) \
+        .where(models.Message.search_vector.op('@@')(tsquery))
+    if teacher_id is not None:
+        page = page.where(models.ClassSubject.user_id == teacher_id)
+    if class_name is not None:
+        page = page \
+            .join(models.Class,
+                  models.Class.id == models.ClassSubject.class_id) \
+            .where(models.Class.name == class_name)
+    if subject_name is not None:
+        page = page \
+            .join(models.Subject,
+                  models.Subject.id == models.ClassSubject.subject_id) \
+            .where(models.Subject.name == subject_name)
+    page = page \
+        .order_by(rank.desc(), models.Message.id.desc()) \
+        .limit(limit) \
+        .offset(offset) \
+        .subquery()
+    
+    statement = select(
+        models.Message.id,
+        models.Message.created_at,
+        models.Class.name.label('class_name'),
+        models.Subject.name.label('subject_name'),
+        models.Message.title,
+        func.ts_headline(
+            config, _html_escape(models.Message.text), tsquery,
+            HEADLINE_OPTIONS
+        ).label('headline'),
+        page.c.rank,
+    ) \
+        .join(page, and_(page.c.id == models.Message.id,
+                         page.c.created_at == models.Message.created_at)) \
+        .join(models.ClassSubject,
+              models.ClassSubject.id == models.Message.class_subject_id) \
+        .join(models.Class, models.Class.id == models.ClassSubject.class_id) \
+        .join(models.Subject,
+              models.Subject.id == models.ClassSubject.subject_id) \
+        .order_by(page.c.rank.desc(), models.Message.id.desc())
+    result = await db.execute(statement)
+    return result.all()
+
+
 def create_class_subject_message(
         db: Session,
         message: schemas.MessageBase,
         class_subject: models.ClassSubject,
         user: models.User
 ):
+    # Added by id, as appending to class_subject.messages would load the
+    # whole history first.
     db_message = models.Message(
         title=message.title,
         text=message.text,
-        user_id=user.id
+        user_id=user.id,
+        class_subject_id=class_subject.id
+    )
+    db.add(db_message)
+    guild_id = class_subject.class_.guild_id
+    if guild_id is not None:
+        bot_events_crud.add_bot_event(db, guild_id, 'POST', '/messages', {
+            'guild_id': guild_id,
+            'subject': class_subject.subject.name,
+            'title': message.title,
+            'text': message.text,
+            'user': f'{user.first_name} {user.last_name}'
+        })
+    etags.bump(db, etags.messages(class_subject.id))
+    db.flush()
+    feeds.publish(
+        db, _feed_topics(class_subject), 'message_created', {
+            'class_subject_id': class_subject.id,
+            # The shape of schemas.MessageWithUser.
+            'message': {
+                'title': db_message.title,
+                'text': db_message.text,
+                'id': db_message.id,
+                'created_at': db_message.created_at,
+                'user': serializers.user(user),
+            },
+        }, db_message.id
     )
-    class_subject.messages.append(db_message)
     db.commit()
 
 
 def delete_class_subject_message(db: Session, message: models.Message):
     db.delete(message)
+    etags.bump(db, etags.messages(message.class_subject_id))
+    feeds.publish(
+        db, _feed_topics(message.class_subject), 'message_deleted', {
+            'class_subject_id': message.class_subject_id,
+            'id': message.id,
+        }
+    )
     db.commit()
+
+
+def _feed_topics(class_subject: models.ClassSubject):
+    topics = [feeds.ALL, feeds.class_subject(class_subject.id)]
+    if class_subject.user_id is not None:
+        topics.append(feeds.teacher(class_subject.user_id))
+    return topics
@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def get_message_partitions(db: Session) -> List[str]:
+    return db.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'message' "
+        "ORDER BY child.relname"
+    )).scalars().all()
+
+
+def create_message_partition(
+        db: Session, name: str, start: datetime, end: datetime
+):
+    # DDL takes no bind parameters. The name and bounds are made by
+    # retention.py, never by a request.
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF message "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    db.commit()
+
+
+def drop_message_partition(db: Session, name: str):
+    db.execute(text(f"ALTER TABLE message DETACH PARTITION {name}"))
+    db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
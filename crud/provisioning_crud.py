@@ -0,0 +1,182 @@
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from crud import bot_events_crud, classes_crud, token_versions_crud, \
+    users_crud
+import changes
+import etags
+import models
+import schemas
+
+
+def prefetch(db: Session, plan: schemas.ProvisioningPlan):
+    """
+    Loads everything the plan refers to in one query per table, as
+    dicts keyed the way the plan names them. Emails are lowercased.
+    """
+    class_names = {class_.name for class_ in plan.classes} \
+        | {assignment.class_name for assignment in plan.assignments}
+    subject_names = {subject.name for subject in plan.subjects} \
+        | {assignment.subject_name for assignment in plan.assignments}
+    emails = {class_.class_teacher.lower() for class_ in plan.classes
+              if class_.class_teacher is not None} \
+        | {assignment.teacher.lower() for assignment in plan.assignments
+           if assignment.teacher is not None} \
+        | {scope.email.lower() for scope in plan.scopes}
+
+    classes = db.execute(
+        select(models.Class).where(models.Class.name.in_(class_names))
+    ).scalars().all()
+    subjects = db.execute(
+        select(models.Subject).where(models.Subject.name.in_(subject_names))
+    ).scalars().all()
+    users = db.execute(
+        select(models.User)
+        .where(func.lower(models.User.email).in_(emails))
+    ).scalars().all()
+    subject_ids = {subject.id for subject in subjects}
+    class_subjects = [
+        class_subject for class_subject in db.execute(
+            select(models.ClassSubject).where(models.ClassSubject.class_id.in_(
+                [class_.id for class_ in classes]
+            ))
+        ).scalars()
+        if class_subject.subject_id in subject_ids
+    ] if classes and subjects else []
+
+    return {
+        'classes': {class_.name: class_ for class_ in classes},
+        'subjects': {subject.name: subject for subject in subjects},
+        'users': {user.email.lower(): user for user in users},
+        'class_subjects': {
+            (class_subject.class_id, class_subject.subject_id): class_subject
+            for class_subject in class_subjects
+        },
+        # Current Class Teacher of each Class, by Class id.
+        'class_teachers': {user.class_id: user for user in db.execute(
+            select(models.User).where(models.User.class_id.in_(
+                [class_.id for class_ in classes]
+            ))
+        ).scalars()},
+    }
+
+
+def _insert_named(db: Session, model, rows: list):
+    """
+    Inserts the rows with one multi-row INSERT and returns the ids of the
+    new rows by name.
+    """
+    if not rows:
+        return {}
+    db.execute(insert(model).values(rows))
+    names = [row['name'] for row in rows]
+    return dict(db.execute(
+        select(model.name, model.id).where(model.name.in_(names))
+    ).all())
+
+
+def apply_plan(db: Session, plan: schemas.ProvisioningPlan, lookups: dict):
+    """
+    Applies a plan that was validated against the lookups returned by
+    prefetch, in a single transaction.
+    """
+    class_ids = {name: class_.id
+                 for name, class_ in lookups['classes'].items()}
+    subject_ids = {name: subject.id
+                   for name, subject in lookups['subjects'].items()}
+    users = lookups['users']
+
+    new_classes = [{'name': class_.name,
+                    'key': classes_crud.generate_class_key()}
+                   for class_ in plan.classes
+                   if class_.name not in class_ids]
+    class_ids.update(_insert_named(db, models.Class, new_classes))
+    new_subjects = [{'name': subject.name}
+                    for subject in plan.subjects
+                    if subject.name not in subject_ids]
+    subject_ids.update(_insert_named(db, models.Subject, new_subjects))
+
+    new_class_subjects, teacher_changes = [], []
+    for assignment in plan.assignments:
+        class_id = class_ids[assignment.class_name]
+        subject_id = subject_ids[assignment.subject_name]
+        teacher_id = users[assignment.teacher.lower()].id \
+            if assignment.teacher is not None else None
+        existing = lookups['class_subjects'].get((class_id, subject_id))
+        if existing is None:
+            new_class_subjects.append({
+                'class_id': class_id,
+                'subject_id': subject_id,
+                'user_id': teacher_id,
+            })
+        elif teacher_id is not None and existing.user_id != teacher_id:
+            teacher_changes.append({'id': existing.id, 'user_id': teacher_id})
+    if new_class_subjects:
+        db.execute(insert(models.ClassSubject).values(new_class_subjects))
+    db.bulk_update_mappings(models.ClassSubject, teacher_changes)
+
+    # Only Classes that existed before can have a Discord server. Their
+    # events are added in plan order, so the outbox sends each guild's
+    # events as one ordered batch.
+    for assignment in plan.assignments:
+        class_ = lookups['classes'].get(assignment.class_name)
+        subject_id = subject_ids[assignment.subject_name]
+        if class_ is None or class_.guild_id is None \
+                or (class_.id, subject_id) in lookups['class_subjects']:
+            continue
+        bot_events_crud.add_bot_event(
+            db, class_.guild_id, 'POST', '/subjects', {
+                'guild_id': class_.guild_id,
+                'subject': assignment.subject_name,
+            }
+        )
+
+    # users.class_id is unique, so the replaced Class Teachers are
+    # unassigned before the new ones are set.
+    released, assigned, changed_emails = [], [], set()
+    for class_ in plan.classes:
+        if class_.class_teacher is None:
+            continue
+        user = users[class_.class_teacher.lower()]
+        class_id = class_ids[class_.name]
+        current = lookups['class_teachers'].get(class_id)
+        if current is not None and current.id == user.id:
+            continue
+        if current is not None:
+            released.append({'id': current.id, 'class_id': None})
+            changed_emails.add(current.email.lower())
+        assigned.append({'id': user.id, 'class_id': class_id})
+        changed_emails.add(user.email.lower())
+    db.bulk_update_mappings(models.User, released)
+    db.bulk_update_mappings(models.User, assigned)
+
+    scoped = []
+    for scope in plan.scopes:
+        verified, admin = users_crud.scope_flags(scope.scope)
+        scoped.append({'id': users[scope.email.lower()].id,
+                       'verified': verified, 'admin': admin})
+        changed_emails.add(scope.email.lower())
+    db.bulk_update_mappings(models.User, scoped)
+    if scoped:
+        token_versions_crud.bump_token_versions(
+            db, [mapping['id'] for mapping in scoped]
+        )
+
+    etags.bump(db, etags.CLASSES, etags.SUBJECTS, etags.CLASS_SUBJECTS,
+               etags.USERS)
+    if changed_emails:
+        changes.emit(db, changes.PRINCIPALS, *sorted(changed_emails))
+    if scoped:
+        changes.emit(db, changes.TOKEN_VERSIONS,
+                     *[mapping['id'] for mapping in scoped])
+    db.commit()
+
+    return {
+        'classes': len(new_classes),
+        'subjects': len(new_subjects),
+        'assignments': len(new_class_subjects),
+        'teachers': len(teacher_changes) + len(assigned) + sum(
+            1 for row in new_class_subjects if row['user_id'] is not None
+        ),
+        'scopes': len(scoped),
+    }
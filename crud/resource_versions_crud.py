@@ -0,0 +1,33 @@
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+
+
+def _resource_versions(keys: Iterable[str]):
+    return select(models.ResourceVersion.key, models.ResourceVersion.version) \
+        .where(models.ResourceVersion.key.in_(list(keys)))
+
+
+def get_resource_versions(db: Session, keys: Iterable[str]):
+    return dict(db.execute(_resource_versions(keys)).all())
+
+
+async def get_resource_versions_async(db: AsyncSession, keys: Iterable[str]):
+    result = await db.execute(_resource_versions(keys))
+    return dict(result.all())
+
+
+def bump_resource_versions(db: Session, keys: Iterable[str]):
+    # No commit here, the bump belongs to the transaction of the change.
+    statement = insert(models.ResourceVersion) \
+        .values([{'key': key, 'version': 1} for key in sorted(set(keys))])
+    statement = statement.on_conflict_do_update(
+        index_elements=[models.ResourceVersion.key],
+        set_={'version': models.ResourceVersion.version + 1}
+    )
+    db.execute(statement)
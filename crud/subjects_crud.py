@@ -1,5 +1,8 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 
+import etags
 import models
 import schemas
 
@@ -9,16 +12,62 @@ def get_subject_by_name(db: Session, name: str):
         .filter(models.Subject.name == name).first()
 
 
-def get_class_subject_by_objects(
-        db: Session, class_: models.Class, subject: models.Subject
+def _class_subject_by_names(class_name: str, subject_name: str):
+    return select(models.Class, models.Subject, models.ClassSubject) \
+        .select_from(models.Class) \
+        .outerjoin(models.Subject, models.Subject.name == subject_name) \
+        .outerjoin(models.ClassSubject, and_(
+            models.ClassSubject.class_id == models.Class.id,
+            models.ClassSubject.subject_id == models.Subject.id
+        )) \
+        .options(joinedload(models.ClassSubject.teacher)) \
+        .where(models.Class.name == class_name)
+
+
+def get_class_subject_by_names(
+        db: Session, class_name: str, subject_name: str
 ):
-    return db.query(models.ClassSubject) \
-        .filter(models.ClassSubject.subject == subject,
-                models.ClassSubject.class_ == class_).first()
+    """
+    Loads the Class, the Subject and their ClassSubject (with its teacher)
+    in a single query. Returns None when the Class does not exist, the
+    Subject and ClassSubject in the returned row are None when missing.
+    """
+    return db.execute(_class_subject_by_names(class_name, subject_name)) \
+        .first()
 
 
-def get_all_subjects(db: Session):
-    return db.query(models.Subject).order_by(models.Subject.name).all()
+async def get_class_subject_by_names_async(
+        db: AsyncSession, class_name: str, subject_name: str
+):
+    result = await db.execute(
+        _class_subject_by_names(class_name, subject_name)
+    )
+    return result.first()
+
+
+async def get_subject_by_name_async(db: AsyncSession, name: str):
+    result = await db.execute(
+        select(models.Subject).where(models.Subject.name == name)
+    )
+    return result.scalars().first()
+
+
+async def get_subject_classes_async(db: AsyncSession, subject: models.Subject):
+    result = await db.execute(
+        select(models.Class)
+        .join(models.ClassSubject,
+              models.ClassSubject.class_id == models.Class.id)
+        .where(models.ClassSubject.subject_id == subject.id)
+        .order_by(models.Class.name)
+    )
+    return result.scalars().all()
+
+
+async def get_all_subjects_async(db: AsyncSession):
+    result = await db.execute(
+        select(models.Subject).order_by(models.Subject.name)
+    )
+    return result.scalars().all()
 
 
 def create_subject(db: Session, subject: schemas.SubjectCreate):
@@ -26,6 +75,7 @@ def create_subject(db: Session, subject: schemas.SubjectCreate):
         name=subject.name
     )
     db.add(db_subject)
+    etags.bump(db, etags.SUBJECTS)
     db.commit()
     db.refresh(db_subject)
 
@@ -35,10 +85,12 @@ def edit_subject(
         new_subject: schemas.SubjectCreate
 ):
     subject.name = new_subject.name
+    etags.bump(db, etags.SUBJECTS)
     db.commit()
     db.refresh(subject)
 
 
 def delete_subject(db: Session, subject: models.Subject):
     db.delete(subject)
+    etags.bump(db, etags.SUBJECTS, etags.CLASS_SUBJECTS)
     db.commit()
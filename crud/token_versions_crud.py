@@ -0,0 +1,39 @@
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import models
+
+
+def get_token_version(db: Session, user_id: int):
+    version = db.query(models.TokenVersion.version) \
+        .filter(models.TokenVersion.user_id == user_id).scalar()
+    return version or 0
+
+
+async def get_token_version_async(db: AsyncSession, user_id: int):
+    version = await db.scalar(
+        select(models.TokenVersion.version)
+        .where(models.TokenVersion.user_id == user_id)
+    )
+    return version or 0
+
+
+def bump_token_version(db: Session, user_id: int):
+    bump_token_versions(db, [user_id])
+
+
+def bump_token_versions(db: Session, user_ids: Iterable[int]):
+    # No commit here, the bump belongs to the transaction of the change that
+    # revokes the tokens.
+    statement = insert(models.TokenVersion) \
+        .values([{'user_id': user_id, 'version': 1}
+                 for user_id in sorted(set(user_ids))]) \
+        .on_conflict_do_update(
+            index_elements=[models.TokenVersion.user_id],
+            set_={'version': models.TokenVersion.version + 1}
+        )
+    db.execute(statement)
@@ -1,5 +1,10 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from crud import loading, token_versions_crud
+import changes
+import etags
 import models
 import schemas
 
@@ -12,41 +17,76 @@ def create_user(db: Session, user: schemas.UserCreate):
         last_name=user.last_name,
     )
     db.add(db_user)
+    etags.bump(db, etags.USERS)
     db.commit()
     db.refresh(db_user)
 
 
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User) \
-        .filter(models.User.email == email).first()
+        .filter(func.lower(models.User.email) == email.lower()).first()
 
 
-def get_all_users(db: Session):
-    return db.query(models.User).all()
+async def get_user_by_email_async(
+        db: AsyncSession, email: str, schema=schemas.UserWithClass
+):
+    statement = select(models.User) \
+        .where(func.lower(models.User.email) == email.lower())
+    result = await db.execute(loading.load_for(statement, schema))
+    return result.scalars().first()
+
+
+async def get_all_users_async(db: AsyncSession):
+    result = await db.execute(
+        loading.load_for(select(models.User), schemas.UserWithClass)
+    )
+    return result.scalars().all()
 
 
 def edit_user(db: Session, user: models.User, new_user: schemas.UserBase):
+    old_email = user.email
     user.first_name = new_user.first_name
     user.last_name = new_user.last_name
     user.email = new_user.email
+    etags.bump(db, etags.USERS)
+    changes.emit(db, changes.PRINCIPALS, old_email.lower())
     db.commit()
     db.refresh(user)
 
 
-def edit_user_scope(db: Session, user: models.User, scope: str):
+def edit_user_password(db: Session, user: models.User, password: str):
+    user.password = password
+    db.commit()
+    db.refresh(user)
+
+
+def scope_flags(scope: str):
+    """
+    Returns the (verified, admin) flags of a scope.
+    """
     if scope == 'admin':
-        user.verified = True
-        user.admin = True
+        return True, True
     elif scope == 'user':
-        user.verified = True
-        user.admin = False
+        return True, False
     else:
-        user.verified = False
-        user.admin = False
+        return False, False
+
+
+def edit_user_scope(db: Session, user: models.User, scope: str):
+    user.verified, user.admin = scope_flags(scope)
+    token_versions_crud.bump_token_version(db, user.id)
+    etags.bump(db, etags.USERS)
+    changes.emit(db, changes.PRINCIPALS, user.email.lower())
+    changes.emit(db, changes.TOKEN_VERSIONS, user.id)
     db.commit()
     db.refresh(user)
 
 
 def delete_user(db: Session, user: models.User):
+    email, user_id = user.email, user.id
+    token_versions_crud.bump_token_version(db, user_id)
     db.delete(user)
+    etags.bump(db, etags.USERS)
+    changes.emit(db, changes.PRINCIPALS, email.lower())
+    changes.emit(db, changes.TOKEN_VERSIONS, user_id)
     db.commit()
@@ -1,5 +1,10 @@
+import threading
+import time
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import environ
 
 env = environ.Env(
@@ -7,11 +12,130 @@ env = environ.Env(
 )
 environ.Env.read_env()
 
-url = f'postgresql://{env("DB_USERNAME")}' \
-      f':{env("DB_PASSWORD")}' \
-      f'@{env("DB_HOST")}' \
-      f':{env("DB_PORT")}' \
-      f'/{env("DB_DATABASE")}'
+credentials = f'{env("DB_USERNAME")}' \
+              f':{env("DB_PASSWORD")}' \
+              f'@{env("DB_HOST")}' \
+              f':{env("DB_PORT")}' \
+              f'/{env("DB_DATABASE")}'
+url = f'postgresql://{credentials}'
+async_url = f'postgresql+asyncpg://{credentials}'
+
+# Every worker process opens its own sync and async pool, so a worker can
+# hold up to 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections to the
+# primary, and as many to the replica when one is configured.
+DB_POOL_SIZE = env.int('DB_POOL_SIZE', default=5)
+DB_MAX_OVERFLOW = env.int('DB_MAX_OVERFLOW', default=10)
+DB_POOL_TIMEOUT = env.float('DB_POOL_TIMEOUT', default=30.0)
+DB_POOL_RECYCLE = env.int('DB_POOL_RECYCLE', default=1800)
+DB_POOL_PRE_PING = env.bool('DB_POOL_PRE_PING', default=True)
+
+# Optional streaming replica with the same credentials and database. Empty
+# values, as in a copied .env.example, count as not set.
+DB_REPLICA_HOST = env('DB_REPLICA_HOST', default=None) or None
+DB_REPLICA_PORT = env('DB_REPLICA_PORT', default=None) or env('DB_PORT')
+
+
+class InstrumentedPool:
+    """
+    Records how long checkouts wait for a connection and how many of them
+    fail, on top of the counters the queue pool already keeps.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._waiting = 0
+        self._checkouts = 0
+        self._failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._waiting += 1
+        try:
+            connection = super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self._waiting -= 1
+                self._failures += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._stats_lock:
+            self._waiting -= 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return connection
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_in': self.checkedin(),
+                'checked_out': self.checkedout(),
+                'overflow': max(self.overflow(), 0),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'failures': self._failures,
+                'wait_total': self._wait_total,
+                'wait_max': self._wait_max,
+            }
+
+
+class InstrumentedQueuePool(InstrumentedPool, QueuePool):
+    pass
+
 
-engine = create_engine(url)
+class InstrumentedAsyncPool(InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+pool_options = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+engine = create_engine(url, poolclass=InstrumentedQueuePool, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
+
+# Used by the read-only routes, which then wait on Postgres without
+# holding a threadpool slot.
+async_engine = create_async_engine(
+    async_url, poolclass=InstrumentedAsyncPool, **pool_options
+)
+AsyncSessionLocal = sessionmaker(
+    autocommit=False, autoflush=True, bind=async_engine,
+    class_=AsyncSession, expire_on_commit=False
+)
+
+if DB_REPLICA_HOST:
+    replica_url = f'postgresql+asyncpg://{env("DB_USERNAME")}' \
+                  f':{env("DB_PASSWORD")}' \
+                  f'@{DB_REPLICA_HOST}' \
+                  f':{DB_REPLICA_PORT}' \
+                  f'/{env("DB_DATABASE")}'
+    replica_engine = create_async_engine(
+        replica_url, poolclass=InstrumentedAsyncPool, **pool_options
+    )
+    ReadSessionLocal = sessionmaker(
+        autocommit=False, autoflush=True, bind=replica_engine,
+        class_=AsyncSession, expire_on_commit=False
+    )
+else:
+    replica_engine = None
+    ReadSessionLocal = AsyncSessionLocal
+
+
+def pool_stats():
+    return {
+        'sync_engine': engine.pool.stats(),
+        'async_engine': async_engine.sync_engine.pool.stats(),
+        'replica_engine': replica_engine.sync_engine.pool.stats()
+        if replica_engine is not None else None,
+    }
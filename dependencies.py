@@ -1,9 +1,15 @@
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from crud import users_crud
+from crud import subjects_crud, token_versions_crud, users_crud
+import cache
+import changes
+import handlers
 import models
-from database import SessionLocal
-from fastapi import Depends, HTTPException, status
+import schemas
+from database import AsyncSessionLocal, ReadSessionLocal, SessionLocal
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import environ
@@ -24,30 +30,75 @@ def get_db():
         database.close()
 
 
-def get_current_user(token: str = Depends(oauth2_scheme),
-                     database: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Идентификационните данни не можаха да бъдат валидирани!",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+async def get_async_db():
+    async with AsyncSessionLocal() as database:
+        yield database
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Идентификационните данни не можаха да бъдат валидирани!",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+async def get_token_data(request: Request,
+                         token: str = Depends(oauth2_scheme)):
+    """
+    Validates the token and returns its claims. The only DB access is
+    reading the User's token version from the primary, and that is cached
+    for a few seconds. Async, so the read routes never wait on the
+    threadpool. A User making a write is pinned to the primary for their
+    next reads, in every worker.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        user = users_crud.get_user_by_email(database, email)
+        token_data = schemas.TokenData(
+            email=payload.get('sub'),
+            id=payload.get('uid'),
+            verified=payload.get('verified'),
+            admin=payload.get('admin'),
+            version=payload.get('ver'),
+        )
+    except (JWTError, ValidationError):
+        raise credentials_exception
+    
+    version = cache.token_versions.get(token_data.id)
+    if version is None:
+        async with AsyncSessionLocal() as database:
+            version = await token_versions_crud.get_token_version_async(
+                database, token_data.id
+            )
+        cache.token_versions.set(token_data.id, version)
+    if token_data.version != version:
+        raise credentials_exception
+    if request.method not in SAFE_METHODS:
+        # The next read of the User may land on any worker.
+        await changes.broadcast(changes.REPLICA_PINS, token_data.id)
+    return token_data
+
+
+def get_current_user(token_data: schemas.TokenData = Depends(get_token_data),
+                     database: Session = Depends(get_db)):
+    user = cache.principals.get(token_data.email.lower())
+    if user is None:
+        user = users_crud.get_user_by_email(database, token_data.email)
         if user is None:
             raise credentials_exception
-        return user
-        # token_data = schemas.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
+        database.expunge(user)
+        cache.principals.set(token_data.email.lower(), user)
+    # A copy attached to this request's Session, made without a query.
+    return database.merge(user, load=False)
 
 
-def get_user_is_verified(user: models.User = Depends(get_current_user)):
-    if user.verified:
-        return user
+async def require_verified(
+        token_data: schemas.TokenData = Depends(get_token_data)
+):
+    if token_data.verified:
+        return token_data
     else:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -55,12 +106,74 @@ def get_user_is_verified(user: models.User = Depends(get_current_user)):
         )
 
 
-def get_user_is_admin(user: models.User = Depends(get_current_user)):
-    if user.admin:
-        return user
+async def require_admin(
+        token_data: schemas.TokenData = Depends(get_token_data)
+):
+    if token_data.admin:
+        return token_data
     else:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='За да извършите това действие трябва да бъдете Админ!'
                    'Ако смятате това за грешка, свържете се с такъв.'
         )
+
+
+def get_user_is_verified(
+        token_data: schemas.TokenData = Depends(require_verified),
+        user: models.User = Depends(get_current_user)
+):
+    return user
+
+
+def get_user_is_admin(
+        token_data: schemas.TokenData = Depends(require_admin),
+        user: models.User = Depends(get_current_user)
+):
+    return user
+
+
+def get_class_subject_path(class_name: str, subject_name: str,
+                           database: Session = Depends(get_db)):
+    """
+    Resolves the Class, Subject and ClassSubject of a
+    /classes/{class_name}/subjects/{subject_name} path in one query.
+    The ClassSubject is None when the Subject is not assigned to the Class.
+    """
+    row = subjects_crud.get_class_subject_by_names(
+        database, class_name, subject_name
+    )
+    if row is None:
+        handlers.handle_class_is_none(class_name)
+    if row.Subject is None:
+        handlers.handle_subject_is_none(subject_name)
+    return row
+
+
+async def get_read_db(
+        token_data: schemas.TokenData = Depends(get_token_data)
+):
+    """
+    Session for the read-only routes. It reads from the replica, unless
+    the User wrote something in the last few seconds.
+    """
+    if cache.replica_pins.get(token_data.id):
+        session_factory = AsyncSessionLocal
+    else:
+        session_factory = ReadSessionLocal
+    async with session_factory() as database:
+        yield database
+
+
+async def get_class_subject_path_async(
+        class_name: str, subject_name: str,
+        database: AsyncSession = Depends(get_read_db)
+):
+    row = await subjects_crud.get_class_subject_by_names_async(
+        database, class_name, subject_name
+    )
+    if row is None:
+        handlers.handle_class_is_none(class_name)
+    if row.Subject is None:
+        handlers.handle_subject_is_none(subject_name)
+    return row
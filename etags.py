@@ -0,0 +1,132 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from crud import resource_versions_crud
+import cache
+import changes
+import database
+
+# Resource keys. Every list or detail response is tagged with the versions
+# of all the keys whose writes can change it.
+CLASSES = 'classes'
+SUBJECTS = 'subjects'
+CLASS_SUBJECTS = 'class_subjects'
+USERS = 'users'
+
+# Kind of change sent with the bumped keys, see changes.py.
+BUMPED = 'bumped_resources'
+
+# The replica lags behind the primary, so the versions read from each are
+# cached apart. A tag is then never newer than the DB its body comes from.
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+
+def messages(class_subject_id: int):
+    return f'messages:{class_subject_id}'
+
+
+def bump(db: Session, *keys: str):
+    """
+    Bumps the versions of the keys in the transaction of the change. The
+    cached versions are dropped in every worker once that transaction
+    commits.
+    """
+    resource_versions_crud.bump_resource_versions(db, keys)
+    changes.emit(db, BUMPED, *keys)
+
+
+def _forget_bumped(keys: list):
+    for key in keys:
+        cache.resource_versions.invalidate((PRIMARY, key))
+        cache.resource_versions.invalidate((REPLICA, key))
+
+
+changes.register(BUMPED, _forget_bumped, reset=cache.resource_versions.clear)
+
+
+def _source(db) -> str:
+    if database.replica_engine is not None \
+            and db.bind is database.replica_engine:
+        return REPLICA
+    return PRIMARY
+
+
+def _cached(source, keys):
+    versions = {key: cache.resource_versions.get((source, key))
+                for key in keys}
+    return versions, [key for key, version in versions.items()
+                      if version is None]
+
+
+def _remember(source, versions, missing, loaded):
+    for key in missing:
+        versions[key] = loaded.get(key, 0)
+        cache.resource_versions.set((source, key), versions[key])
+    return versions
+
+
+def _make_etag(keys, versions):
+    return '"' + '.'.join(str(versions[key]) for key in keys) + '"'
+
+
+def etag(db: Session, *keys: str):
+    versions, missing = _cached(PRIMARY, keys)
+    if missing:
+        loaded = resource_versions_crud.get_resource_versions(db, missing)
+        _remember(PRIMARY, versions, missing, loaded)
+    return _make_etag(keys, versions)
+
+
+async def etag_async(db: AsyncSession, *keys: str):
+    source = _source(db)
+    versions, missing = _cached(source, keys)
+    if missing:
+        loaded = await resource_versions_crud.get_resource_versions_async(
+            db, missing
+        )
+        _remember(source, versions, missing, loaded)
+    return _make_etag(keys, versions)
+
+
+async def read_etag_async(db: AsyncSession, *keys: str):
+    """
+    Tag of the versions in the DB, read in the session without the cache.
+    """
+    loaded = await resource_versions_crud.get_resource_versions_async(
+        db, keys
+    )
+    return _make_etag(keys, {key: loaded.get(key, 0) for key in keys})
+
+
+def vary(tag: str, *parts) -> str:
+    """
+    Tag of one variant of a response, such as a page of a list. The parts
+    are hashed, so they may hold characters that are not allowed in a tag.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:12]
+    return f'{tag[:-1]}.{digest}"'
+
+
+def not_modified(request: Request, response: Response,
+                 tag: str) -> Optional[Response]:
+    """
+    Returns a 304 response when the client already has the tagged version,
+    otherwise sets the ETag header on the route's response and returns None.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        candidates = []
+        for candidate in if_none_match.split(','):
+            candidate = candidate.strip()
+            candidates.append(
+                candidate[2:] if candidate.startswith('W/') else candidate
+            )
+        if tag in candidates or '*' in candidates:
+            return Response(status_code=304, headers={'ETag': tag})
+    response.headers['ETag'] = tag
+    return None
@@ -0,0 +1,152 @@
+import asyncio
+from collections import defaultdict
+from typing import Optional
+
+import environ
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+import changes
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+# Events a subscriber may fall behind by before it is disconnected.
+FEED_QUEUE_SIZE = env.int('FEED_QUEUE_SIZE', default=100)
+# Seconds between comments that keep idle connections and proxies alive.
+FEED_KEEPALIVE = env.float('FEED_KEEPALIVE', default=15.0)
+
+# Topics. Every event of a Class Subject is published to its topic, to the
+# topic of its Teacher and to ALL, which Admins subscribe to.
+ALL = 'all'
+
+# Kind of change sent with the events, see changes.py.
+FEED = 'feed'
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_subscribers = defaultdict(set)
+
+
+def class_subject(class_subject_id: int):
+    return f'class_subject:{class_subject_id}'
+
+
+def teacher(user_id: int):
+    return f'teacher:{user_id}'
+
+
+def frame(event_type: str, data: dict, event_id=None) -> bytes:
+    """
+    Encodes an event in the text/event-stream format.
+    """
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event_type}\n'.encode() \
+        + b'data: ' + orjson.dumps(data) + b'\n\n'
+
+
+def publish(db: Session, topics, event_type: str, data: dict,
+            event_id=None):
+    """
+    Publishes the event in every worker once the transaction of the change
+    commits. It is dropped if the transaction is rolled back.
+    """
+    changes.emit(db, FEED, [list(topics), event_type, data, event_id])
+
+
+def _close(queue: asyncio.Queue):
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(None)
+
+
+def deliver(events):
+    """
+    Puts the events in the queues of the subscribers, at most once per
+    subscriber. Runs on the event loop.
+    """
+    for topics, event_type, data, event_id in events:
+        data = frame(event_type, data, event_id)
+        queues = set()
+        for topic in topics:
+            queues.update(_subscribers.get(topic, ()))
+        for queue in queues:
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                # A client that stopped reading is disconnected instead of
+                # buffering events for it without bound.
+                _close(queue)
+
+
+def _publish(events: list):
+    # Called in the threadpool on commit, or on the event loop for the
+    # changes of other workers.
+    if _loop is not None:
+        _loop.call_soon_threadsafe(deliver, events)
+
+
+def _resync(event):
+    # Sent to the other workers instead of a Message too large for a
+    # notification.
+    topics, _, data, _ = event
+    return [topics, 'resync',
+            {'class_subject_id': data.get('class_subject_id')}, None]
+
+
+changes.register(FEED, _publish, shrink=_resync)
+
+
+async def _events(topics):
+    queue = asyncio.Queue(FEED_QUEUE_SIZE)
+    for topic in topics:
+        _subscribers[topic].add(queue)
+    try:
+        yield b': connected\n\n'
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), FEED_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            if data is None:
+                return
+            yield data
+    finally:
+        for topic in topics:
+            _subscribers[topic].discard(queue)
+            if not _subscribers[topic]:
+                del _subscribers[topic]
+
+
+def event_stream(*topics: str) -> StreamingResponse:
+    """
+    Server-Sent Events response with the events published to the topics
+    from now on. A client that reconnects, or gets a `resync` event, reloads
+    the Messages of the Class Subject through the paginated routes.
+    """
+    return StreamingResponse(
+        _events(topics),
+        media_type='text/event-stream',
+        headers={
+            # no-transform also keeps CompressionMiddleware out of it.
+            'Cache-Control': 'no-cache, no-transform',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+async def start():
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+
+async def stop():
+    global _loop
+    _loop = None
+    # Ends the streams that are still open.
+    for queues in list(_subscribers.values()):
+        for queue in queues:
+            _close(queue)
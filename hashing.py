@@ -0,0 +1,99 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import environ
+from passlib.context import CryptContext
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+HASH_WORKERS = env.int('HASH_WORKERS', default=2)
+HASH_CONCURRENCY = env.int('HASH_CONCURRENCY', default=HASH_WORKERS)
+BCRYPT_ROUNDS = env.int('BCRYPT_ROUNDS', default=12)
+
+# Hashes made with a different cost than BCRYPT_ROUNDS need an update, so
+# changing the setting rehashes the passwords on the next login.
+bcrypt = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+_waiting = 0
+_running = 0
+
+
+def _hash(password: str):
+    return bcrypt.hash(password)
+
+
+def _verify_and_update(password: str, password_hash: str):
+    return bcrypt.verify_and_update(password, password_hash)
+
+
+async def _submit(function, *args):
+    """
+    Runs a hashing function in the process pool once one of the
+    HASH_CONCURRENCY slots is free. The event loop and the threadpool of the
+    sync routes are never busy with bcrypt.
+    """
+    global _waiting, _running
+    _waiting += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _waiting -= 1
+    _running += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_pool, function, *args)
+    finally:
+        _running -= 1
+        _slots.release()
+
+
+async def hash_password(password: str):
+    return await _submit(_hash, password)
+
+
+async def verify_password(password: str, password_hash: str):
+    """
+    Returns whether the password matches, and a new hash when the stored one
+    was made with outdated cost parameters.
+    """
+    return await _submit(_verify_and_update, password, password_hash)
+
+
+def stats():
+    return {
+        'workers': HASH_WORKERS,
+        'concurrency': HASH_CONCURRENCY,
+        'rounds': BCRYPT_ROUNDS,
+        'running': _running,
+        'waiting': _waiting,
+    }
+
+
+async def start():
+    global _pool, _slots
+    # Spawned, not forked, so the workers do not inherit the locks, sockets
+    # and DB pools of this process. They only import this module.
+    _pool = ProcessPoolExecutor(
+        max_workers=HASH_WORKERS,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+    _slots = asyncio.Semaphore(HASH_CONCURRENCY)
+
+
+async def stop():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
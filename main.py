@@ -1,14 +1,20 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.templating import Jinja2Templates
 
-import models
+import bot
+import changes
+import feeds
+import hashing
+import outbox
+import retention
+from compression import CompressionMiddleware
 from metadata import tags_metadata
-from database import engine
 from routers import auth, users, classes, subjects, class_subjects, \
-    class_subject_messages, discord, status
+    class_subject_messages, discord, status, provisioning, exports, search, \
+    archive
 
-models.Base.metadata.create_all(bind=engine)
 templates = Jinja2Templates(directory="templates")
 
 app = FastAPI(
@@ -20,7 +26,8 @@ app = FastAPI(
         "url": "https://www.linkedin.com/in/alex-naida/",
         "email": "a.o.naidenov@gmail.com",
     },
-    openapi_tags=tags_metadata
+    openapi_tags=tags_metadata,
+    default_response_class=ORJSONResponse,
 )
 
 origins = [
@@ -32,7 +39,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -42,6 +51,30 @@ app.include_router(class_subjects.router)
 app.include_router(class_subject_messages.router)
 app.include_router(discord.router)
 app.include_router(status.router)
+app.include_router(provisioning.router)
+app.include_router(exports.router)
+app.include_router(search.router)
+app.include_router(archive.router)
+
+
+@app.on_event('startup')
+async def startup():
+    await changes.start()
+    await feeds.start()
+    await bot.start()
+    await outbox.start()
+    await hashing.start()
+    await retention.start()
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    await retention.stop()
+    await hashing.stop()
+    await outbox.stop()
+    await bot.stop()
+    await feeds.stop()
+    await changes.stop()
 
 
 @app.get(
@@ -43,6 +43,29 @@ tags_metadata = [
                        "Used for bot *initialization*, *deactivation* "
                        "and other Discord Bot commands.",
     },
+    {
+        "name": "Provisioning",
+        "description": "Bulk setup of a **school year** for Admins. "
+                       "Creates *Classes* and *Subjects*, assigns "
+                       "*Subjects* and *Teachers* and sets *scopes* "
+                       "in a single transaction.",
+    },
+    {
+        "name": "Search",
+        "description": "**Full-text search** over the *Messages* "
+                       "that the current User may see.",
+    },
+    {
+        "name": "Export",
+        "description": "Streaming **exports** for Admins, such as the "
+                       "end-of-term *Message* archive as NDJSON or CSV.",
+    },
+    {
+        "name": "Archive",
+        "description": "Read-only access for Admins to the *Messages* of "
+                       "past **school years**, which were moved out of the "
+                       "database into compressed archive files.",
+    },
     {
         "name": "Status",
         "description": "Single endpoint for getting the *Status* "
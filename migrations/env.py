@@ -0,0 +1,57 @@
+import os
+import re
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models  # noqa: E402
+from database import engine, url  # noqa: E402
+
+config = context.config
+fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+# Partitions of the message table, made by migration 0007 and by
+# retention.py. They are not in the models, see retention.PARTITION_PATTERN.
+MESSAGE_PARTITION = re.compile(r'^message_\d{4}_\d{4}$')
+
+
+def include_object(object_, name, type_, reflected, compare_to):
+    if type_ == 'table':
+        return not MESSAGE_PARTITION.match(name)
+    if type_ == 'index':
+        return not MESSAGE_PARTITION.match(object_.table.name)
+    return True
+
+
+def run_migrations_offline():
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
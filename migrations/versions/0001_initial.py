@@ -0,0 +1,96 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+The schema that main.py used to create with create_all. Databases created
+that way should be marked with `alembic stamp 0001` before upgrading.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'class',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('guild_id', sa.String(length=20), nullable=True),
+        sa.Column('name', sa.String(length=10), nullable=False),
+        sa.Column('key', sa.String(length=60), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('guild_id'),
+        sa.UniqueConstraint('key'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_index(op.f('ix_class_id'), 'class', ['id'])
+    op.create_table(
+        'subject',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'),
+    )
+    op.create_index(op.f('ix_subject_id'), 'subject', ['id'])
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=50), nullable=False),
+        sa.Column('password', sa.String(length=60), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=False),
+        sa.Column('last_name', sa.String(length=50), nullable=False),
+        sa.Column('verified', sa.Boolean(), nullable=False),
+        sa.Column('admin', sa.Boolean(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('class_id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_index(op.f('ix_user_id'), 'user', ['id'])
+    op.create_table(
+        'class_subject',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.Column('subject_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id']),
+        sa.ForeignKeyConstraint(['subject_id'], ['subject.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_class_subject_id'), 'class_subject', ['id'])
+    op.create_table(
+        'message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=50), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('created_at', postgresql.TIMESTAMP(), nullable=False),
+        sa.Column('class_subject_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['class_subject_id'], ['class_subject.id'], ondelete='CASCADE'
+        ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_message_id'), 'message', ['id'])
+
+
+def downgrade():
+    op.drop_index(op.f('ix_message_id'), table_name='message')
+    op.drop_table('message')
+    op.drop_index(op.f('ix_class_subject_id'), table_name='class_subject')
+    op.drop_table('class_subject')
+    op.drop_index(op.f('ix_user_id'), table_name='user')
+    op.drop_table('user')
+    op.drop_index(op.f('ix_subject_id'), table_name='subject')
+    op.drop_table('subject')
+    op.drop_index(op.f('ix_class_id'), table_name='class')
+    op.drop_table('class')
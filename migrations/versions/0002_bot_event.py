@@ -0,0 +1,41 @@
+"""bot event outbox
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'bot_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('guild_id', sa.String(length=20), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('path', sa.String(length=50), nullable=False),
+        sa.Column(
+            'payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False
+        ),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('created_at', postgresql.TIMESTAMP(), nullable=False),
+        sa.Column('next_attempt_at', postgresql.TIMESTAMP(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_bot_event_id'), 'bot_event', ['id'])
+    op.create_index(
+        op.f('ix_bot_event_next_attempt_at'), 'bot_event', ['next_attempt_at']
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_bot_event_next_attempt_at'), table_name='bot_event')
+    op.drop_index(op.f('ix_bot_event_id'), table_name='bot_event')
+    op.drop_table('bot_event')
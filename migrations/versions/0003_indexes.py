@@ -0,0 +1,52 @@
+"""indexes for foreign keys and lookups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:20:00
+
+message.class_subject_id is covered by the leading column of
+ix_message_class_subject_id_created_at_id.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_class_subject_class_id_subject_id', 'class_subject',
+        ['class_id', 'subject_id'], unique=True
+    )
+    op.create_index(
+        op.f('ix_class_subject_subject_id'), 'class_subject', ['subject_id']
+    )
+    op.create_index(
+        op.f('ix_class_subject_user_id'), 'class_subject', ['user_id']
+    )
+    op.create_index(
+        'ix_message_class_subject_id_created_at_id', 'message',
+        ['class_subject_id', 'created_at', 'id']
+    )
+    op.create_index(op.f('ix_message_user_id'), 'message', ['user_id'])
+    op.create_index(
+        'ix_user_email_lower', 'user', [sa.text('lower(email)')]
+    )
+
+
+def downgrade():
+    op.drop_index('ix_user_email_lower', table_name='user')
+    op.drop_index(op.f('ix_message_user_id'), table_name='message')
+    op.drop_index(
+        'ix_message_class_subject_id_created_at_id', table_name='message'
+    )
+    op.drop_index(op.f('ix_class_subject_user_id'), table_name='class_subject')
+    op.drop_index(
+        op.f('ix_class_subject_subject_id'), table_name='class_subject'
+    )
+    op.drop_index(
+        'ix_class_subject_class_id_subject_id', table_name='class_subject'
+    )
@@ -0,0 +1,27 @@
+"""token versions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:30:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'token_version',
+        sa.Column('user_id', sa.Integer(), autoincrement=False,
+                  nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('token_version')
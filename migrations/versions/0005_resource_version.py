@@ -0,0 +1,26 @@
+"""resource versions
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:30:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'resource_version',
+        sa.Column('key', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+
+
+def downgrade():
+    op.drop_table('resource_version')
@@ -0,0 +1,63 @@
+"""message full-text search
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 13:30:00
+
+Postgres ships no Bulgarian text search configuration, so `bulgarian`
+starts as a copy of `simple`: lowercased words, no stemming, no stop
+words. A Bulgarian hunspell dictionary can be plugged in later without a
+migration, for example:
+
+    CREATE TEXT SEARCH DICTIONARY bulgarian_hunspell (
+        TEMPLATE = ispell, DictFile = bg_bg, AffFile = bg_bg
+    );
+    ALTER TEXT SEARCH CONFIGURATION bulgarian
+        ALTER MAPPING FOR word, hword, hword_part
+        WITH bulgarian_hunspell, simple;
+
+The search vectors are only recomputed when a row is written, so existing
+messages need an `UPDATE message SET text = text` after such a change.
+The configuration is left in place if it already exists.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_ts_config WHERE cfgname = 'bulgarian'
+            ) THEN
+                CREATE TEXT SEARCH CONFIGURATION bulgarian (COPY = simple);
+            END IF;
+        END
+        $$
+    """)
+    op.add_column('message', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('bulgarian', title), 'A') || "
+            "setweight(to_tsvector('bulgarian', text), 'B')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index(
+        'ix_message_search_vector', 'message', ['search_vector'],
+        postgresql_using='gin'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_message_search_vector', table_name='message')
+    op.drop_column('message', 'search_vector')
+    op.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS bulgarian')
@@ -0,0 +1,126 @@
+"""message partitions by school year
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:00:00
+
+A table can not be turned into a partitioned one in place, so the
+existing table is renamed, a partitioned `message` is created next to it
+with one partition per school year (September to September) that has
+rows, plus the current and the next one, and the rows are copied over.
+The copy locks the messages for its duration. Later partitions are made
+by retention.py.
+
+The primary key becomes (id, created_at), as the partition key has to be
+part of it. The id sequence is kept, so ids stay unique.
+"""
+from alembic import op
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+INDEXES = """
+    CREATE INDEX ix_message_id ON message (id);
+    CREATE INDEX ix_message_user_id ON message (user_id);
+    CREATE INDEX ix_message_class_subject_id_created_at_id
+        ON message (class_subject_id, created_at, id);
+    CREATE INDEX ix_message_search_vector
+        ON message USING gin (search_vector);
+"""
+
+DROP_INDEXES = """
+    DROP INDEX ix_message_id;
+    DROP INDEX ix_message_user_id;
+    DROP INDEX ix_message_class_subject_id_created_at_id;
+    DROP INDEX ix_message_search_vector;
+"""
+
+SEARCH_VECTOR = """
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('bulgarian', title), 'A') ||
+        setweight(to_tsvector('bulgarian', text), 'B')
+    ) STORED
+"""
+
+
+def _create_message(partition_by: str = ''):
+    primary_key = '(id, created_at)' if partition_by else '(id)'
+    op.execute(f"""
+        CREATE TABLE message (
+            id integer NOT NULL DEFAULT nextval('message_id_seq'),
+            title varchar(50) NOT NULL,
+            text varchar NOT NULL,
+            created_at timestamp without time zone NOT NULL,
+            class_subject_id integer NOT NULL
+                REFERENCES class_subject (id) ON DELETE CASCADE,
+            user_id integer NOT NULL REFERENCES "user" (id),
+            {SEARCH_VECTOR},
+            CONSTRAINT message_pkey PRIMARY KEY {primary_key}
+        ) {partition_by}
+    """)
+
+
+def _replace_message(partition_by: str = ''):
+    op.execute('LOCK TABLE message IN ACCESS EXCLUSIVE MODE')
+    op.execute(DROP_INDEXES)
+    op.execute('ALTER TABLE message RENAME TO message_old')
+    op.execute(
+        'ALTER TABLE message_old RENAME CONSTRAINT message_pkey '
+        'TO message_old_pkey'
+    )
+    _create_message(partition_by)
+    op.execute('ALTER SEQUENCE message_id_seq OWNED BY message.id')
+
+
+def upgrade():
+    _replace_message('PARTITION BY RANGE (created_at)')
+    # Shifting a moment back by 8 months gives the year its school year
+    # started in, see retention.school_year.
+    op.execute("""
+        DO $$
+        DECLARE
+            current_year integer :=
+                extract(year FROM now() - interval '8 months');
+            first_year integer;
+            school_year integer;
+        BEGIN
+            SELECT extract(year FROM min(created_at) - interval '8 months')
+                INTO first_year FROM message_old;
+            FOR school_year IN
+                coalesce(first_year, current_year)..current_year + 1
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE message_%s_%s PARTITION OF message '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    school_year, school_year + 1,
+                    make_date(school_year, 9, 1),
+                    make_date(school_year + 1, 9, 1)
+                );
+            END LOOP;
+        END
+        $$
+    """)
+    op.execute("""
+        INSERT INTO message
+            (id, title, text, created_at, class_subject_id, user_id)
+        SELECT id, title, text, created_at, class_subject_id, user_id
+        FROM message_old
+    """)
+    op.execute('DROP TABLE message_old')
+    op.execute(INDEXES)
+
+
+def downgrade():
+    # The partitions are dropped together with the table. Archived school
+    # years stay in their files.
+    _replace_message()
+    op.execute("""
+        INSERT INTO message
+            (id, title, text, created_at, class_subject_id, user_id)
+        SELECT id, title, text, created_at, class_subject_id, user_id
+        FROM message_old
+    """)
+    op.execute('DROP TABLE message_old')
+    op.execute(INDEXES)
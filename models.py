@@ -1,11 +1,17 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
-from sqlalchemy.dialects.postgresql import TIMESTAMP
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Boolean, Column, Computed, ForeignKey, Index, Integer, \
+    String, func
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP, TSVECTOR
+from sqlalchemy.orm import deferred, relationship, declarative_base
 
 Base = declarative_base()
 
+# Text search configuration of the Message search vectors. It starts as a
+# copy of `simple`, see migration 0006 for plugging in a Bulgarian
+# dictionary.
+SEARCH_CONFIG = 'bulgarian'
+
 
 class Class(Base):
     __tablename__ = "class"
@@ -47,19 +53,28 @@ class Subject(Base):
 
 class ClassSubject(Base):
     __tablename__ = "class_subject"
+    __table_args__ = (
+        Index(
+            'ix_class_subject_class_id_subject_id',
+            'class_id', 'subject_id', unique=True
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     class_id = Column(ForeignKey('class.id'))
-    subject_id = Column(ForeignKey('subject.id'))
-    user_id = Column(ForeignKey('user.id'))
+    subject_id = Column(ForeignKey('subject.id'), index=True)
+    user_id = Column(ForeignKey('user.id'), index=True)
     
     class_ = relationship('Class', viewonly=True)
     subject = relationship('Subject', viewonly=True)
     teacher = relationship('User')
+    # The rows are removed by the ON DELETE CASCADE of the foreign key,
+    # without loading every Message of the partitions first.
     messages = relationship(
         'Message',
         back_populates='class_subject',
-        cascade="all, delete"
+        cascade="all, delete",
+        passive_deletes=True
     )
 
 
@@ -85,17 +100,75 @@ class User(Base):
     )
 
 
+Index('ix_user_email_lower', func.lower(User.email))
+
+
 class Message(Base):
     __tablename__ = "message"
+    __table_args__ = (
+        Index(
+            'ix_message_class_subject_id_created_at_id',
+            'class_subject_id', 'created_at', 'id'
+        ),
+        Index(
+            'ix_message_search_vector', 'search_vector',
+            postgresql_using='gin'
+        ),
+        # One partition per school year, see retention.py.
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    # The partition key has to be part of the primary key.
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     title = Column(String(50), nullable=False)
     text = Column(String, nullable=False)
     created_at = Column(
-        TIMESTAMP(timezone=False), nullable=False, default=datetime.now()
+        TIMESTAMP(timezone=False), primary_key=True, default=datetime.now
     )
     class_subject_id = Column(ForeignKey('class_subject.id', ondelete="CASCADE"), nullable=False)
-    user_id = Column(ForeignKey('user.id'), nullable=False)
+    user_id = Column(ForeignKey('user.id'), nullable=False, index=True)
+    # Kept up to date by Postgres. Deferred so that loading Messages does
+    # not read it.
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', title), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', text), 'B')",
+        persisted=True
+    )))
     
     class_subject = relationship('ClassSubject', back_populates="messages")
     user = relationship('User')
+
+
+class TokenVersion(Base):
+    __tablename__ = "token_version"
+    
+    # Not a foreign key, the row has to outlive a deleted User so that the
+    # tokens issued to them stay revoked.
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class BotEvent(Base):
+    __tablename__ = "bot_event"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    guild_id = Column(String(length=20), nullable=False)
+    method = Column(String(length=10), nullable=False)
+    path = Column(String(length=50), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(
+        TIMESTAMP(timezone=False), nullable=False, default=datetime.now
+    )
+    next_attempt_at = Column(
+        TIMESTAMP(timezone=False), nullable=False, default=datetime.now,
+        index=True
+    )
+
+
+class ResourceVersion(Base):
+    __tablename__ = "resource_version"
+    
+    # Bumped by every write that changes the resource, see etags.py.
+    key = Column(String(length=50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import environ
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from crud import bot_events_crud
+from database import SessionLocal
+import bot
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=100)
+OUTBOX_POLL_INTERVAL = env.float('OUTBOX_POLL_INTERVAL', default=5.0)
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=20)
+OUTBOX_BACKOFF_BASE = env.float('OUTBOX_BACKOFF_BASE', default=1.0)
+OUTBOX_BACKOFF_MAX = env.float('OUTBOX_BACKOFF_MAX', default=600.0)
+
+# Added to BOT_TIMEOUT for the time a single request may take, as httpx
+# applies the timeout to each phase of the request.
+LEASE_MARGIN = 1.0
+
+# Client errors that may go away on their own. Any other 4xx means the Bot
+# will never accept the event, so it is dropped instead of retried.
+RETRYABLE_STATUSES = (408, 425, 429)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+logger = logging.getLogger(__name__)
+
+
+def backoff(attempts: int) -> timedelta:
+    delay = OUTBOX_BACKOFF_BASE * 2 ** attempts
+    return timedelta(seconds=min(delay, OUTBOX_BACKOFF_MAX))
+
+
+def lease() -> timedelta:
+    """
+    Time a claimed batch is kept from other workers. The events of a guild
+    are sent one at a time, so it covers a batch of a single guild, plus a
+    request's worth for the claim itself.
+    """
+    return timedelta(
+        seconds=(OUTBOX_BATCH_SIZE + 1) * (bot.BOT_TIMEOUT + LEASE_MARGIN)
+    )
+
+
+def _claim():
+    database = SessionLocal(expire_on_commit=False)
+    try:
+        # The lease keeps other workers away from the claimed events while
+        # they are being sent, without holding the row locks.
+        return bot_events_crud.claim_bot_events(
+            database, OUTBOX_BATCH_SIZE, lease()
+        )
+    finally:
+        database.close()
+
+
+def _finish(delivered: list, failed: list):
+    database = SessionLocal()
+    try:
+        dropped = [events[0].id for events in failed
+                   if events[0].attempts + 1 >= OUTBOX_MAX_ATTEMPTS]
+        bot_events_crud.delete_bot_events(database, delivered + dropped)
+        for events in failed:
+            if events[0].id in dropped:
+                # The rest were never sent, so they are due right away and
+                # keep their attempts.
+                if len(events) > 1:
+                    bot_events_crud.reschedule_bot_events(
+                        database, None, [event.id for event in events[1:]],
+                        datetime.now()
+                    )
+                continue
+            bot_events_crud.reschedule_bot_events(
+                database, events[0].id, [event.id for event in events],
+                datetime.now() + backoff(events[0].attempts)
+            )
+    finally:
+        database.close()
+
+
+async def _deliver(events: list, deadline: float):
+    """
+    Sends the events of a single guild in order. Returns the ids of the
+    delivered and rejected events and the events left for a retry, starting
+    with the one that failed. Sending stops when the lease could run out
+    during the next request, the unsent events are claimed again once it
+    has.
+    """
+    loop = asyncio.get_running_loop()
+    delivered = []
+    for index, event in enumerate(events):
+        if loop.time() + bot.BOT_TIMEOUT + LEASE_MARGIN > deadline:
+            return delivered, []
+        try:
+            await bot.request(event.method, event.path, event.payload)
+        except httpx.HTTPStatusError as error:
+            status_code = error.response.status_code
+            if status_code >= 500 or status_code in RETRYABLE_STATUSES:
+                return delivered, events[index:]
+            # Retrying would only hold back the later events of the guild.
+            logger.warning('The Bot rejected event %s with %s, dropping it',
+                           event.id, status_code)
+        except httpx.HTTPError:
+            return delivered, events[index:]
+        delivered.append(event.id)
+    return delivered, []
+
+
+async def drain():
+    """
+    Delivers one batch of pending events. Returns the number of claimed
+    events, so the caller knows whether to continue right away.
+    """
+    # Taken before the claim, so it never ends after the lease.
+    deadline = asyncio.get_running_loop().time() + lease().total_seconds()
+    events = await run_in_threadpool(_claim)
+    if not events:
+        return 0
+
+    guilds = defaultdict(list)
+    for event in events:
+        guilds[event.guild_id].append(event)
+    results = await asyncio.gather(
+        *(_deliver(guild_events, deadline)
+          for guild_events in guilds.values())
+    )
+
+    delivered = [event_id for ids, _ in results for event_id in ids]
+    failed = [remaining for _, remaining in results if remaining]
+    await run_in_threadpool(_finish, delivered, failed)
+    return len(events)
+
+
+async def _run():
+    while True:
+        try:
+            claimed = await drain()
+        except Exception:  # pylint: disable=broad-except
+            # The worker must survive a lost DB connection.
+            logger.exception('Delivering the outbox failed')
+            claimed = 0
+        if claimed >= OUTBOX_BATCH_SIZE:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def wake():
+    """
+    Signals the worker that new events were committed. Safe to call from
+    both async routes and sync routes running in the threadpool.
+    """
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def start():
+    global _loop, _wakeup, _task
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _loop, _task
+    _loop = None
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
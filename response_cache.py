@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable
+
+from fastapi import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import cache
+import changes
+import etags
+
+# One lock per key, so that concurrent misses of the same key wait for a
+# single build instead of all querying the DB.
+_building = {}
+# Cache keys of the responses that depend on each resource key.
+_dependants = defaultdict(set)
+_dependants_lock = threading.Lock()
+
+
+async def get_or_build(
+        db: AsyncSession, key: tuple, tag: str, resources: Iterable[str],
+        build: Callable[[], Awaitable[bytes]]
+) -> Response:
+    """
+    Returns the cached body of the key when it was built for the current
+    tag, otherwise builds it once no matter how many requests are waiting.
+    The resources are the keys of the tag.
+
+    A build reads the versions again from the session of the body, right
+    before it. The tag may come from the cache, filled from the other
+    database, so the body is cached and sent with the versions it is at
+    least as new as.
+    """
+    entry = cache.responses.get(key)
+    if entry is None or entry[0] != tag:
+        async with _building.setdefault(key, asyncio.Lock()):
+            entry = cache.responses.get(key)
+            if entry is None or entry[0] != tag:
+                current = await etags.read_etag_async(db, *resources)
+                entry = (current, await build())
+                cache.responses.set(key, entry)
+                with _dependants_lock:
+                    for resource in resources:
+                        _dependants[resource].add(key)
+    return Response(
+        entry[1], media_type='application/json', headers={'ETag': entry[0]}
+    )
+
+
+def invalidate(resources: Iterable[str]):
+    with _dependants_lock:
+        keys = set().union(*(_dependants.pop(resource, ())
+                             for resource in resources))
+    for key in keys:
+        cache.responses.invalidate(key)
+
+
+def clear():
+    with _dependants_lock:
+        _dependants.clear()
+    cache.responses.clear()
+
+
+changes.register(etags.BUMPED, invalidate, reset=clear)
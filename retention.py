@@ -0,0 +1,200 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import datetime
+from typing import List, Optional
+
+import environ
+import orjson
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from crud import messages_crud, partitions_crud
+from database import engine
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+# Number of school years, the current one included, kept in the database.
+MESSAGE_RETENTION_YEARS = env.int('MESSAGE_RETENTION_YEARS', default=2)
+ARCHIVE_DIR = env('ARCHIVE_DIR', default='archive')
+RETENTION_INTERVAL = env.float('RETENTION_INTERVAL', default=86400.0)
+ARCHIVE_BATCH_SIZE = env.int('ARCHIVE_BATCH_SIZE', default=1000)
+
+# The partitions are made per school year, starting on the 1st of this
+# month. Not configurable, the existing partitions depend on it.
+SCHOOL_YEAR_START_MONTH = 9
+
+# Key of the advisory lock that lets a single worker run the job.
+RETENTION_LOCK_ID = 7021
+
+TERM_PATTERN = re.compile(r'^(\d{4})-(\d{4})$')
+PARTITION_PATTERN = re.compile(r'^message_(\d{4})_(\d{4})$')
+
+_task: Optional[asyncio.Task] = None
+
+logger = logging.getLogger(__name__)
+
+
+def school_year(moment: datetime) -> int:
+    """
+    Returns the year in which the school year of the moment started.
+    """
+    if moment.month >= SCHOOL_YEAR_START_MONTH:
+        return moment.year
+    return moment.year - 1
+
+
+def term_name(year: int) -> str:
+    return f'{year}-{year + 1}'
+
+
+def term_year(term: str) -> Optional[int]:
+    match = TERM_PATTERN.match(term)
+    if match is None or int(match[2]) != int(match[1]) + 1:
+        return None
+    return int(match[1])
+
+
+def term_bounds(year: int):
+    return datetime(year, SCHOOL_YEAR_START_MONTH, 1), \
+        datetime(year + 1, SCHOOL_YEAR_START_MONTH, 1)
+
+
+def partition_name(year: int) -> str:
+    return f'message_{year}_{year + 1}'
+
+
+def archive_path(year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f'messages_{term_name(year)}.ndjson.gz')
+
+
+def archived_years() -> List[int]:
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    years = []
+    for file_name in os.listdir(ARCHIVE_DIR):
+        match = re.match(r'^messages_(\d{4}-\d{4})\.ndjson\.gz$', file_name)
+        if match is not None and term_year(match[1]) is not None:
+            years.append(term_year(match[1]))
+    return sorted(years)
+
+
+def ensure_partitions(db: Session, now: datetime = None):
+    """
+    Creates the partitions of the current and of the next school year, so
+    that inserts never run out of partitions.
+    """
+    current = school_year(now or datetime.now())
+    for year in (current, current + 1):
+        partitions_crud.create_message_partition(
+            db, partition_name(year), *term_bounds(year)
+        )
+
+
+def archive_partition(db: Session, year: int):
+    """
+    Writes the Messages of a school year to a gzipped NDJSON file and then
+    drops their partition. The file is complete before it gets its final
+    name, so an interrupted run is simply repeated.
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(year)
+    since, until = term_bounds(year)
+    with open(f'{path}.tmp', 'wb') as file:
+        with gzip.GzipFile(fileobj=file, mode='wb') as archive:
+            for rows in messages_crud.stream_messages(
+                    db, ARCHIVE_BATCH_SIZE, since=since, until=until
+            ):
+                archive.write(b''.join(
+                    orjson.dumps(dict(row._mapping)) + b'\n' for row in rows
+                ))
+        file.flush()
+        os.fsync(file.fileno())
+    db.commit()
+    os.replace(f'{path}.tmp', path)
+    partitions_crud.drop_message_partition(db, partition_name(year))
+
+
+def run_retention(now: datetime = None):
+    """
+    Creates the upcoming partitions and archives the ones older than
+    MESSAGE_RETENTION_YEARS. Returns the archived years.
+    """
+    now = now or datetime.now()
+    oldest_kept = school_year(now) - MESSAGE_RETENTION_YEARS + 1
+    archived = []
+    # A session level lock needs the same connection for the whole run.
+    with engine.connect() as connection:
+        db = Session(bind=connection)
+        locked = db.execute(
+            select(func.pg_try_advisory_lock(RETENTION_LOCK_ID))
+        ).scalar()
+        db.commit()
+        if not locked:
+            return archived
+        try:
+            ensure_partitions(db, now)
+            for name in partitions_crud.get_message_partitions(db):
+                match = PARTITION_PATTERN.match(name)
+                if match is not None and int(match[1]) < oldest_kept:
+                    archive_partition(db, int(match[1]))
+                    archived.append(int(match[1]))
+        finally:
+            db.rollback()
+            db.execute(select(func.pg_advisory_unlock(RETENTION_LOCK_ID)))
+            db.commit()
+            db.close()
+    return archived
+
+
+def read_archive(year: int, batch_size: int = ARCHIVE_BATCH_SIZE):
+    """
+    Yields the archived Messages of a school year as dicts, in batches.
+    """
+    with gzip.open(archive_path(year), 'rb') as archive:
+        batch = []
+        for line in archive:
+            batch.append(orjson.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+async def _run():
+    while True:
+        try:
+            await run_in_threadpool(run_retention)
+        except Exception:  # pylint: disable=broad-except
+            # A failed run is retried at the next interval.
+            logger.exception('Archiving old Messages failed, retrying in '
+                             '%.0fs', RETENTION_INTERVAL)
+        await asyncio.sleep(RETENTION_INTERVAL)
+
+
+async def start():
+    global _task
+    # With 0 the current school year would be archived and dropped.
+    if MESSAGE_RETENTION_YEARS < 1:
+        raise environ.ImproperlyConfigured(
+            'MESSAGE_RETENTION_YEARS must be at least 1'
+        )
+    _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
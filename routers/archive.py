@@ -0,0 +1,75 @@
+import os
+from typing import List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+import retention
+import schemas
+from dependencies import require_admin
+
+router = APIRouter(
+    prefix='/archive',
+    tags=['Archive'],
+    dependencies=[Depends(require_admin)]
+)
+
+
+def _archived_messages(year: int, class_name: Optional[str],
+                       subject_name: Optional[str], teacher: Optional[str]):
+    teacher = teacher.lower() if teacher is not None else None
+    for batch in retention.read_archive(year):
+        yield b''.join(
+            orjson.dumps(message) + b'\n' for message in batch
+            if (class_name is None or message['class_name'] == class_name)
+            and (subject_name is None
+                 or message['subject_name'] == subject_name)
+            and (teacher is None or (message['teacher'] or '').lower()
+                 == teacher)
+        )
+
+
+@router.get(
+    '/terms',
+    response_model=List[schemas.ArchivedTerm],
+    summary='Lists the school years whose Messages were moved out of the '
+            'database into archive files.',
+)
+def get_archived_terms():
+    terms = []
+    for year in retention.archived_years():
+        since, until = retention.term_bounds(year)
+        terms.append(schemas.ArchivedTerm(
+            term=retention.term_name(year),
+            since=since,
+            until=until,
+            size=os.path.getsize(retention.archive_path(year)),
+        ))
+    return terms
+
+
+@router.get(
+    '/terms/{term}/messages',
+    summary='Streams the archived Messages of a school year, such as '
+            '2023-2024, that match the filters as NDJSON.',
+)
+def get_archived_messages(
+        term: str,
+        class_name: Optional[str] = None,
+        subject_name: Optional[str] = None,
+        teacher: Optional[str] = None
+):
+    year = retention.term_year(term)
+    if year is None or year not in retention.archived_years():
+        raise HTTPException(
+            status_code=404,
+            detail=f"Няма архив за учебната {term} година!"
+        )
+    # A sync iterator, which StreamingResponse reads in the threadpool.
+    return StreamingResponse(
+        _archived_messages(year, class_name, subject_name, teacher),
+        media_type='application/x-ndjson',
+        headers={'Content-Disposition':
+                 f'attachment; filename="messages_{term}.ndjson"'}
+    )
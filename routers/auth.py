@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from jose import jwt
 import environ
 from datetime import datetime, timedelta
 
-from crud import users_crud
-import models
+from crud import token_versions_crud, users_crud
+import hashing
 import schemas
-from dependencies import get_db, get_current_user
+from dependencies import get_db, get_token_data
 
 router = APIRouter(
     tags=['Auth'],
@@ -23,8 +23,6 @@ SECRET_KEY = env('SECRET_KEY')
 ALGORITHM = env('ALGORITHM')
 TOKEN_EXPIRATION = env('TOKEN_EXPIRATION')
 
-bcrypt = CryptContext(schemes=["bcrypt"])
-
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -38,7 +36,8 @@ def create_access_token(data: dict):
     '/register',
     summary='Path for User Registration'
 )
-def register(user: schemas.UserCreate, database: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate,
+                   database: Session = Depends(get_db)):
     if len(user.first_name) < 3 or len(user.first_name) > 50 \
             or len(user.last_name) < 3 or len(user.last_name) > 50:
         raise HTTPException(
@@ -51,14 +50,16 @@ def register(user: schemas.UserCreate, database: Session = Depends(get_db)):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Невалиден Имейл адрес!'
         )
-    if users_crud.get_user_by_email(database, user.email):
+    if await run_in_threadpool(
+            users_crud.get_user_by_email, database, user.email
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Този Имейл вече е регистриран!'
         )
     
-    user.password = bcrypt.hash(user.password)
-    users_crud.create_user(database, user)
+    user.password = await hashing.hash_password(user.password)
+    await run_in_threadpool(users_crud.create_user, database, user)
 
 
 @router.post(
@@ -66,20 +67,38 @@ def register(user: schemas.UserCreate, database: Session = Depends(get_db)):
     response_model=schemas.Token,
     summary='Path for User Login'
 )
-def login(request: schemas.Login, database: Session = Depends(get_db)):
-    user = users_crud.get_user_by_email(database, request.email)
+async def login(request: schemas.Login, database: Session = Depends(get_db)):
+    user = await run_in_threadpool(
+        users_crud.get_user_by_email, database, request.email
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Не беше намерен Потребител с Имейл '{request.email}'!"
         )
-    if not bcrypt.verify(request.password, user.password):
+    verified, new_hash = await hashing.verify_password(
+        request.password, user.password
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f'Грешна Парола!'
         )
+    if new_hash is not None:
+        await run_in_threadpool(
+            users_crud.edit_user_password, database, user, new_hash
+        )
     
-    access_token = create_access_token(data={"sub": user.email})
+    version = await run_in_threadpool(
+        token_versions_crud.get_token_version, database, user.id
+    )
+    access_token = create_access_token(data={
+        "sub": user.email,
+        "uid": user.id,
+        "verified": user.verified,
+        "admin": user.admin,
+        "ver": version,
+    })
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -88,9 +107,9 @@ def login(request: schemas.Login, database: Session = Depends(get_db)):
     response_model=schemas.Scope,
     summary='Returns the scope of the currently logged User.',
 )
-def scope(user: models.User = Depends(get_current_user)):
-    if user.admin:
+def scope(token_data: schemas.TokenData = Depends(get_token_data)):
+    if token_data.admin:
         return {"scope": 'admin'}
-    if user.verified:
+    if token_data.verified:
         return {"scope": 'user'}
     return {"scope": ''}
@@ -1,99 +1,143 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, \
+    Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette import status
 
-from typing import List
-import requests
-import json
-import environ
+from datetime import datetime
+from typing import List, Optional
 
-from crud import classes_crud, subjects_crud, messages_crud
-import handlers
+from crud import messages_crud
+import etags
+import feeds
+import outbox
 import schemas
 import models
-from dependencies import get_db, get_user_is_verified
-
-env = environ.Env(
-    DEBUG=(bool, False)
-)
-environ.Env.read_env()
-
-BOT_URL = env('BOT_URL')
+import serializers
+from dependencies import get_db, get_read_db, get_user_is_verified, \
+    require_verified, get_class_subject_path, get_class_subject_path_async
 
 router = APIRouter(
     prefix='/classes/{class_name}/subjects/{subject_name}/messages',
     tags=['Class Subject Messages'],
-    dependencies=[Depends(get_db), Depends(get_user_is_verified)]
+    dependencies=[Depends(require_verified)]
 )
 
 
+def encode_cursor(message: models.Message):
+    return f'{message.created_at.isoformat()},{message.id}'
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, message_id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Невалиден курсор '{cursor}'!"
+        )
+
+
 @router.get(
     '',
-    summary="Get the Messages of a Class' Subject.",
+    summary="Get a page of the Messages of a Class' Subject, newest first. "
+            "The cursor for the next page is sent in the X-Next-Cursor header.",
     response_model=List[schemas.MessageWithUser],
 )
-def get_class_subject_messages(
+async def get_class_subject_messages(
+        class_name: str,
+        subject_name: str,
+        request: Request,
+        response: Response,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=200),
+        path=Depends(get_class_subject_path_async),
+        database: AsyncSession = Depends(get_read_db),
+        token_data: schemas.TokenData = Depends(require_verified)
+):
+    db_class_subject = path.ClassSubject
+    if db_class_subject is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Предметът {subject_name} "
+                   f"не е зададен на класа {class_name}!"
+        )
+    if db_class_subject.user_id != token_data.id and not token_data.admin:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"За да видите материалите трябва"
+                   f" да сте Преподаващия или Админ!"
+        )
+    
+    tag = etags.vary(await etags.etag_async(
+        database, etags.messages(db_class_subject.id), etags.USERS
+    ), cursor, limit)
+    not_modified = etags.not_modified(request, response, tag)
+    if not_modified is not None:
+        return not_modified
+    
+    before = decode_cursor(cursor) if cursor is not None else None
+    messages = await messages_crud.get_class_subject_messages_async(
+        database, db_class_subject, limit, before
+    )
+    if len(messages) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(messages[-1])
+    return serializers.respond(schemas.MessageWithUser, messages, response)
+
+
+@router.get(
+    '/feed',
+    summary="Stream the Messages created and deleted in a Class' Subject "
+            "as Server-Sent Events.",
+)
+def get_class_subject_message_feed(
         class_name: str,
         subject_name: str,
+        path=Depends(get_class_subject_path),
         database: Session = Depends(get_db),
         user: models.User = Depends(get_user_is_verified)
 ):
-    db_class = classes_crud.get_class_by_name(database, class_name)
-    if db_class is None:
-        handlers.handle_class_is_none(class_name)
-        
-    db_subject = subjects_crud.get_subject_by_name(database, subject_name)
-    if db_subject is None:
-        handlers.handle_subject_is_none(subject_name)
-        
-    db_class_subject = subjects_crud.get_class_subject_by_objects(
-        database, db_class, db_subject
-    )
+    db_class_subject = path.ClassSubject
     if db_class_subject is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Предметът {subject_name} "
                    f"не е зададен на класа {class_name}!"
         )
-    if db_class_subject.teacher is not user and not user.admin:
+    if db_class_subject.user_id != user.id and not user.admin:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"За да видите материалите трябва"
                    f" да сте Преподаващия или Админ!"
         )
     
-    return db_class_subject.messages
+    # The dependencies are only cleaned up when the stream ends, so the
+    # connection is given back to the pool now.
+    database.close()
+    return feeds.event_stream(feeds.class_subject(db_class_subject.id))
 
 
 @router.post(
     '/create',
     summary="Create a new Message for a Class' Subject.",
 )
-async def create_class_subject_message(
+def create_class_subject_message(
         class_name: str,
         subject_name: str,
         message: schemas.MessageBase,
+        path=Depends(get_class_subject_path),
         database: Session = Depends(get_db),
         user: models.User = Depends(get_user_is_verified)
 ):
-    db_class = classes_crud.get_class_by_name(database, class_name)
-    if db_class is None:
-        await handlers.handle_class_is_none(class_name)
-    
-    db_subject = subjects_crud.get_subject_by_name(database, subject_name)
-    if db_subject is None:
-        await handlers.handle_subject_is_none(subject_name)
-    
-    db_class_subject = subjects_crud.get_class_subject_by_objects(
-        database, db_class, db_subject
-    )
+    db_class_subject = path.ClassSubject
     if db_class_subject is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Предметът {subject_name} "
                    f"не е зададен на класа {class_name}!"
         )
-    if db_class_subject.teacher is not user and not user.admin:
+    if db_class_subject.user_id != user.id and not user.admin:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"За да добавите материал трябва "
@@ -114,23 +158,7 @@ async def create_class_subject_message(
         database, message, db_class_subject, user
     )
     
-    # REQUEST TO THE BOT
-    if db_class.guild_id is not None:
-        try:
-            payload = {
-                'guild_id': db_class.guild_id,
-                'subject': subject_name,
-                'title': message.title,
-                'text': message.text,
-                'user': f'{user.first_name} {user.last_name}'
-            }
-            request = requests.post(
-                f'{BOT_URL}/messages',
-                data=json.dumps(payload),
-                headers={'Content-type': 'application/json'}
-            )
-        except:
-            pass
+    outbox.wake()
 
 
 @router.delete(
@@ -141,20 +169,11 @@ def delete_class_subject_message(
         class_name: str,
         subject_name: str,
         message_id: int,
+        path=Depends(get_class_subject_path),
         database: Session = Depends(get_db),
         user: models.User = Depends(get_user_is_verified)
 ):
-    db_class = classes_crud.get_class_by_name(database, class_name)
-    if db_class is None:
-        handlers.handle_class_is_none(class_name)
-    
-    db_subject = subjects_crud.get_subject_by_name(database, subject_name)
-    if db_subject is None:
-        handlers.handle_subject_is_none(subject_name)
-    
-    db_class_subject = subjects_crud.get_class_subject_by_objects(
-        database, db_class, db_subject
-    )
+    db_class_subject = path.ClassSubject
     if db_class_subject is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -168,7 +187,7 @@ def delete_class_subject_message(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Съобщението, което се опитвате да изтриете не съществува!"
         )
-    if db_message.user is not user and not user.admin:
+    if db_message.user_id != user.id and not user.admin:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="За да изтриете това съобщение, "
@@ -1,28 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from starlette import status
 
 from typing import List
-import requests
-import environ
-import json
 
 from crud import classes_crud, class_subjects_crud, subjects_crud, users_crud
+import etags
+import outbox
 import handlers
 import schemas
-from dependencies import get_db, get_user_is_verified, get_user_is_admin
-
-env = environ.Env(
-    DEBUG=(bool, False)
-)
-environ.Env.read_env()
-
-BOT_URL = env('BOT_URL')
+import serializers
+from dependencies import get_db, require_verified, require_admin, \
+    get_class_subject_path
 
 router = APIRouter(
     prefix='/classes/{class_name}/subjects',
     tags=["Class' Subjects"],
-    dependencies=[Depends(get_db), Depends(get_user_is_verified)]
+    dependencies=[Depends(require_verified)]
 )
 
 
@@ -31,22 +25,28 @@ router = APIRouter(
     response_model=List[schemas.ClassSubjectsWithUser],
     summary='Get a list of the Subjects that are assigned to a Class.'
 )
-def get_class_subjects(class_name: str, database: Session = Depends(get_db)):
+def get_class_subjects(class_name: str, request: Request, response: Response,
+                       database: Session = Depends(get_db)):
     class_ = classes_crud.get_class_by_name(database, class_name)
     if class_ is None:
         handlers.handle_class_is_none(class_name)
-    if class_.class_subjects is None:
-        raise HTTPException(
-            status_code=404,
-            detail=f'Класът няма зададени предмети!'
-        )
-    return class_.class_subjects
+    
+    tag = etags.etag(database, etags.CLASSES, etags.CLASS_SUBJECTS,
+                     etags.SUBJECTS, etags.USERS)
+    not_modified = etags.not_modified(request, response, tag)
+    if not_modified is not None:
+        return not_modified
+    
+    class_subjects = class_subjects_crud.get_class_subjects(database, class_)
+    return serializers.respond(
+        schemas.ClassSubjectsWithUser, class_subjects, response
+    )
 
 
 @router.post(
     '/add',
     summary='Assigns a Subject to a Class.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 async def add_subject_to_class(class_name: str, subject: schemas.SubjectBase,
                                database: Session = Depends(get_db)):
@@ -62,27 +62,13 @@ async def add_subject_to_class(class_name: str, subject: schemas.SubjectBase,
             detail=f"Клас '{class_name}' вече има предмет '{subject.name}'!"
         )
     class_subjects_crud.add_subject_to_class(database, db_class, db_subject)
-    
-    # REQUEST TO THE BOT
-    if db_class.guild_id is not None:
-        try:
-            payload = {
-                'guild_id': db_class.guild_id,
-                'subject': subject.name,
-            }
-            requests.post(
-                f'{BOT_URL}/subjects',
-                data=json.dumps(payload),
-                headers={'Content-type': 'application/json'}
-            )
-        except:
-            pass
+    outbox.wake()
 
 
 @router.delete(
     '/remove',
     summary='Removes a Subject from a Class.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 async def remove_subject_from_class(
         class_name: str, subject: schemas.SubjectBase,
@@ -101,21 +87,7 @@ async def remove_subject_from_class(
         )
     class_subjects_crud\
         .remove_subject_from_class(database, db_class, db_subject)
-    
-    # REQUEST TO THE BOT
-    if db_class.guild_id is not None:
-        try:
-            payload = {
-                'guild_id': db_class.guild_id,
-                'subject': subject.name,
-            }
-            requests.delete(
-                f'{BOT_URL}/subjects',
-                data=json.dumps(payload),
-                headers={'Content-type': 'application/json'}
-            )
-        except:
-            pass
+    outbox.wake()
 
 
 @router.get(
@@ -126,16 +98,10 @@ async def remove_subject_from_class(
 def get_class_subject(
         class_name: str,
         subject_name: str,
+        path=Depends(get_class_subject_path),
         database: Session = Depends(get_db)
 ):
-    db_class = classes_crud.get_class_by_name(database, class_name)
-    if db_class is None:
-        handlers.handle_class_is_none(class_name)
-    db_subject = subjects_crud.get_subject_by_name(database, subject_name)
-    if db_subject is None:
-        handlers.handle_subject_is_none(subject_name)
-    db_class_subject = subjects_crud\
-        .get_class_subject_by_objects(database, db_class, db_subject)
+    db_class_subject = path.ClassSubject
     if db_class_subject is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -147,22 +113,16 @@ def get_class_subject(
 @router.put(
     '/{subject_name}/set_teacher',
     summary='Assigns a Teacher to Subject of a Class.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def set_class_subject_teacher(
         class_name: str,
         subject_name: str,
         email: schemas.Email,
+        path=Depends(get_class_subject_path),
         database: Session = Depends(get_db)
 ):
-    db_class = classes_crud.get_class_by_name(database, class_name)
-    if db_class is None:
-        handlers.handle_class_is_none(class_name)
-    db_subject = subjects_crud.get_subject_by_name(database, subject_name)
-    if db_subject is None:
-        handlers.handle_subject_is_none(subject_name)
-    db_class_subject = subjects_crud\
-        .get_class_subject_by_objects(database, db_class, db_subject)
+    db_class_subject = path.ClassSubject
     if db_class_subject is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -187,21 +147,15 @@ def set_class_subject_teacher(
 @router.delete(
     '/{subject_name}/remove_teacher',
     summary='Remove a Teacher from a Subject of a Class.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def set_class_subject_teacher(
         class_name: str,
         subject_name: str,
+        path=Depends(get_class_subject_path),
         database: Session = Depends(get_db)
 ):
-    db_class = classes_crud.get_class_by_name(database, class_name)
-    if db_class is None:
-        handlers.handle_class_is_none(class_name)
-    db_subject = subjects_crud.get_subject_by_name(database, subject_name)
-    if db_subject is None:
-        handlers.handle_subject_is_none(subject_name)
-    db_class_subject = subjects_crud\
-        .get_class_subject_by_objects(database, db_class, db_subject)
+    db_class_subject = path.ClassSubject
     if db_class_subject is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
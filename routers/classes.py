@@ -1,28 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette import status
 
 from typing import List
-import requests
-import environ
-import json
 
 from crud import classes_crud, users_crud
+import etags
+import outbox
+import response_cache
 import handlers
 import schemas
-from dependencies import get_db, get_user_is_verified, get_user_is_admin
-
-env = environ.Env(
-    DEBUG=(bool, False)
-)
-environ.Env.read_env()
-
-BOT_URL = env('BOT_URL')
+import serializers
+from dependencies import get_db, get_read_db, require_verified, require_admin
 
 router = APIRouter(
     prefix='/classes',
     tags=['Classes'],
-    dependencies=[Depends(get_db), Depends(get_user_is_verified)]
+    dependencies=[Depends(require_verified)]
 )
 
 
@@ -31,15 +26,21 @@ router = APIRouter(
     response_model=List[schemas.ClassWithUser],
     summary='Get the details of all Class objects from the DB.'
 )
-def get_all_classes(database: Session = Depends(get_db)):
-    classes = classes_crud.get_all_classes(database)
-    if classes is None:
-        raise HTTPException(
-            status_code=404,
-            detail='Няма създадени класове!'
-        )
+async def get_all_classes(request: Request, response: Response,
+                          database: AsyncSession = Depends(get_read_db)):
+    tag = await etags.etag_async(database, etags.CLASSES, etags.USERS)
+    not_modified = etags.not_modified(request, response, tag)
+    if not_modified is not None:
+        return not_modified
+    
+    async def build():
+        classes = await classes_crud.get_all_classes_async(database)
+        return serializers.dump(schemas.ClassWithUser, classes)
     
-    return classes
+    return await response_cache.get_or_build(
+        database, ('get_all_classes',), tag, (etags.CLASSES, etags.USERS),
+        build
+    )
 
 
 @router.get(
@@ -47,8 +48,14 @@ def get_all_classes(database: Session = Depends(get_db)):
     response_model=schemas.ClassWithUser,
     summary='Get the details of a Class object from the DB.'
 )
-def get_class(name: str, database: Session = Depends(get_db)):
-    class_ = classes_crud.get_class_by_name(database, name)
+async def get_class(name: str, request: Request, response: Response,
+                    database: AsyncSession = Depends(get_read_db)):
+    tag = await etags.etag_async(database, etags.CLASSES, etags.USERS)
+    not_modified = etags.not_modified(request, response, tag)
+    if not_modified is not None:
+        return not_modified
+    
+    class_ = await classes_crud.get_class_by_name_async(database, name)
     if class_ is None:
         handlers.handle_class_is_none(name)
     
@@ -58,7 +65,7 @@ def get_class(name: str, database: Session = Depends(get_db)):
 @router.post(
     '/create',
     summary='Creates a Class instance in the DB.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def create_class(class_: schemas.ClassCreate, db: Session = Depends(get_db)):
     if len(class_.name) < 2 or len(class_.name) > 10:
@@ -75,10 +82,19 @@ def create_class(class_: schemas.ClassCreate, db: Session = Depends(get_db)):
     classes_crud.create_class(db, class_)
 
 
+@router.post(
+    '/keys/rotate',
+    summary='Replaces the Discord Keys of all Classes with new ones.',
+    dependencies=[Depends(require_admin)]
+)
+def rotate_class_keys(database: Session = Depends(get_db)):
+    classes_crud.rotate_class_keys(database)
+
+
 @router.put(
     '/{name}/edit',
     summary='Edit the details of a Class object from the DB.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def edit_class(name: str, class_: schemas.ClassCreate,
                db: Session = Depends(get_db)):
@@ -101,31 +117,20 @@ def edit_class(name: str, class_: schemas.ClassCreate,
 @router.delete(
     '/{name}/delete',
     summary='Delete a Class instance from the DB.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 async def delete_class(name: str, database: Session = Depends(get_db)):
     db_class = classes_crud.get_class_by_name(database, name)
     if db_class is None:
         await handlers.handle_class_is_none(name)
-    
-    # REQUEST TO THE BOT
-    if db_class.guild_id is not None:
-        try:
-            payload = {'guild_id': db_class.guild_id}
-            requests.delete(
-                f'{BOT_URL}/classes',
-                data=json.dumps(payload),
-                headers={'Content-type': 'application/json'}
-            )
-        except:
-            pass
     classes_crud.delete_class(database, db_class)
+    outbox.wake()
 
 
 @router.put(
     '/{name}/class_teacher/set',
     summary='Assigns a Class Teacher.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def set_class_teacher(name: str, email: schemas.Email,
                       database: Session = Depends(get_db)):
@@ -150,7 +155,7 @@ def set_class_teacher(name: str, email: schemas.Email,
 @router.delete(
     '/{name}/class_teacher/remove',
     summary='Removes a Class Teacher.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def remove_subject_from_class(name: str, database: Session = Depends(get_db)):
     db_class = classes_crud.get_class_by_name(database, name)
@@ -163,7 +168,7 @@ def remove_subject_from_class(name: str, database: Session = Depends(get_db)):
     '/{name}/key',
     response_model=schemas.Key,
     summary='Get the Key of a Class for Discord Bot initialization.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def get_class_discord_key(name: str, database: Session = Depends(get_db)):
     class_ = classes_crud.get_class_by_name(database, name)
@@ -0,0 +1,86 @@
+import csv
+import io
+from datetime import datetime
+from typing import Optional
+
+import environ
+import orjson
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import messages_crud
+import schemas
+from dependencies import get_read_db, require_admin
+
+env = environ.Env(
+    DEBUG=(bool, False)
+)
+environ.Env.read_env()
+
+EXPORT_BATCH_SIZE = env.int('EXPORT_BATCH_SIZE', default=1000)
+
+MESSAGE_COLUMNS = ('id', 'created_at', 'class_name', 'subject_name',
+                   'teacher', 'author', 'title', 'text')
+
+router = APIRouter(
+    prefix='/export',
+    tags=['Export'],
+    dependencies=[Depends(require_admin)]
+)
+
+
+async def _ndjson(batches):
+    async for rows in batches:
+        yield b''.join(
+            orjson.dumps(dict(row._mapping)) + b'\n' for row in rows
+        )
+
+
+async def _csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MESSAGE_COLUMNS)
+    async for rows in batches:
+        for row in rows:
+            writer.writerow([row.id, row.created_at.isoformat(), *row[2:]])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Only the header when nothing matched.
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get(
+    '/messages',
+    summary='Streams the Messages that match the filters as NDJSON or CSV, '
+            'ordered by Class Subject and time.',
+)
+async def export_messages(
+        export_format: schemas.ExportFormat = Query(
+            schemas.ExportFormat.ndjson, alias='format'
+        ),
+        class_name: Optional[str] = None,
+        subject_name: Optional[str] = None,
+        teacher: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        database: AsyncSession = Depends(get_read_db)
+):
+    batches = messages_crud.stream_messages_async(
+        database, EXPORT_BATCH_SIZE,
+        class_name=class_name,
+        subject_name=subject_name,
+        teacher=teacher,
+        since=since,
+        until=until,
+    )
+    if export_format == schemas.ExportFormat.csv:
+        content, media_type = _csv(batches), 'text/csv'
+    else:
+        content, media_type = _ndjson(batches), 'application/x-ndjson'
+    return StreamingResponse(content, media_type=media_type, headers={
+        'Content-Disposition':
+            f'attachment; filename="messages.{export_format.value}"'
+    })
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from starlette import status
+
+from crud import provisioning_crud, users_crud
+import outbox
+import schemas
+from dependencies import get_db, require_admin
+
+router = APIRouter(
+    prefix='/provisioning',
+    tags=['Provisioning'],
+    dependencies=[Depends(get_db), Depends(require_admin)]
+)
+
+
+def _duplicates(values):
+    seen, duplicates = set(), []
+    for value in values:
+        if value in seen and value not in duplicates:
+            duplicates.append(value)
+        seen.add(value)
+    return duplicates
+
+
+def validate_plan(plan: schemas.ProvisioningPlan, lookups: dict):
+    """
+    Checks the plan against the prefetched rows with the same rules as the
+    single-object routes. Returns all the errors instead of the first one.
+    """
+    errors = []
+    users = lookups['users']
+    
+    for class_ in plan.classes:
+        if len(class_.name) < 2 or len(class_.name) > 10:
+            errors.append(f"Името на Клас '{class_.name}' трябва да бъде "
+                          f"между 2 и 10 символа!")
+    for name in _duplicates(class_.name for class_ in plan.classes):
+        errors.append(f"Клас '{name}' се повтаря в плана!")
+    for subject in plan.subjects:
+        if len(subject.name) < 3 or len(subject.name) > 50:
+            errors.append(f"Името на Предмет '{subject.name}' трябва да бъде "
+                          f"между 3 и 50 символа!")
+    for name in _duplicates(subject.name for subject in plan.subjects):
+        errors.append(f"Предмет '{name}' се повтаря в плана!")
+    
+    for email in _duplicates(scope.email.lower() for scope in plan.scopes):
+        errors.append(f"Потребител с имейл '{email}' се повтаря в плана!")
+    # Teachers have to be verified once the plan's scopes are applied.
+    verified = {email: user.verified for email, user in users.items()}
+    for scope in plan.scopes:
+        email = scope.email.lower()
+        if email not in users:
+            errors.append(f"Потребител с имейл '{scope.email}' "
+                          f"не съществува!")
+        else:
+            verified[email] = users_crud.scope_flags(scope.scope)[0]
+    
+    def check_teacher(email: str):
+        if email.lower() not in users:
+            errors.append(f"Потребител с имейл '{email}' не съществува!")
+        elif not verified[email.lower()]:
+            errors.append(f"Потребителят с имейл '{email}' не е потвърден! "
+                          f"За да бъде Преподавател трябва първо "
+                          f"Админ да потвърди акаунта му.")
+    
+    class_names = {class_.name for class_ in plan.classes} \
+        | set(lookups['classes'])
+    subject_names = {subject.name for subject in plan.subjects} \
+        | set(lookups['subjects'])
+    for assignment in plan.assignments:
+        if assignment.class_name not in class_names:
+            errors.append(f"Клас с име '{assignment.class_name}' "
+                          f"не съществува!")
+        if assignment.subject_name not in subject_names:
+            errors.append(f"Предмет с име '{assignment.subject_name}' "
+                          f"не съществува!")
+        if assignment.teacher is not None:
+            check_teacher(assignment.teacher)
+    for class_name, subject_name in _duplicates(
+            (assignment.class_name, assignment.subject_name)
+            for assignment in plan.assignments
+    ):
+        errors.append(f"Предмет '{subject_name}' на клас '{class_name}' "
+                      f"се повтаря в плана!")
+    
+    class_teachers = [class_ for class_ in plan.classes
+                      if class_.class_teacher is not None]
+    for email in _duplicates(class_.class_teacher.lower()
+                             for class_ in class_teachers):
+        errors.append(f"Потребителят с имейл '{email}' е класен "
+                      f"на повече от един клас в плана!")
+    for class_ in class_teachers:
+        check_teacher(class_.class_teacher)
+        user = users.get(class_.class_teacher.lower())
+        current = lookups['classes'].get(class_.name)
+        if user is not None and user.class_id is not None \
+                and (current is None or user.class_id != current.id):
+            errors.append(f"Потребителят с имейл '{user.email}' вече е "
+                          f"класен на друг клас!")
+    return errors
+
+
+@router.post(
+    '',
+    response_model=schemas.ProvisioningResult,
+    summary='Creates the Classes and Subjects of a school plan, assigns '
+            'the Subjects and Teachers and sets the Users\' scopes '
+            'in a single transaction.',
+)
+def provision(plan: schemas.ProvisioningPlan,
+              database: Session = Depends(get_db)):
+    lookups = provisioning_crud.prefetch(database, plan)
+    errors = validate_plan(plan, lookups)
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=errors
+        )
+    result = provisioning_crud.apply_plan(database, plan, lookups)
+    outbox.wake()
+    return result
@@ -0,0 +1,37 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import messages_crud
+import schemas
+from dependencies import get_read_db, require_verified
+
+router = APIRouter(
+    prefix='/search',
+    tags=['Search'],
+    dependencies=[Depends(require_verified)]
+)
+
+
+@router.get(
+    '/messages',
+    response_model=List[schemas.MessageSearchResult],
+    summary="Full-text search over the titles and texts of the Messages. "
+            "Teachers search the Subjects they teach, Admins search all.",
+)
+async def search_messages(
+        q: str = Query(..., min_length=2, max_length=200),
+        class_name: Optional[str] = None,
+        subject_name: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0, le=1000),
+        token_data: schemas.TokenData = Depends(require_verified),
+        database: AsyncSession = Depends(get_read_db)
+):
+    return await messages_crud.search_messages_async(
+        database, q, limit, offset,
+        teacher_id=None if token_data.admin else token_data.id,
+        class_name=class_name,
+        subject_name=subject_name,
+    )
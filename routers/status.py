@@ -1,24 +1,17 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
-import environ
-import requests
-
 from crud import classes_crud
+import bot
+import database
+import hashing
 import schemas
-from dependencies import get_db, get_current_user
-
-env = environ.Env(
-    DEBUG=(bool, False)
-)
-environ.Env.read_env()
-
-BOT_URL = env('BOT_URL')
+from dependencies import get_db, get_token_data, require_admin
 
 router = APIRouter(
     prefix='/status',
     tags=['Status'],
-    dependencies=[Depends(get_current_user)]
+    dependencies=[Depends(get_token_data)]
 )
 
 
@@ -29,19 +22,29 @@ router = APIRouter(
 )
 def status(db: Session = Depends(get_db)):
     initialized_classes = classes_crud.get_initialized_classes_count(db)
-    bot_online = False
-    
-    # REQUEST TO THE BOT
-    try:
-        requests.get(
-            f'{BOT_URL}/status',
-            headers={'Content-type': 'application/json'}
-        )
-        bot_online = True
-    except:
-        pass
     
     return {
-        'bot': bot_online,
+        'bot': bot.online,
+        'bot_checked_ago': bot.status_age(),
         'servers': initialized_classes
     }
+
+
+@router.get(
+    '/hashing',
+    response_model=schemas.HashingStatus,
+    summary="Route for checking the load of the password hashing pool.",
+    dependencies=[Depends(require_admin)]
+)
+def hashing_status():
+    return hashing.stats()
+
+
+@router.get(
+    '/database',
+    response_model=schemas.DatabaseStatus,
+    summary="Route for checking the usage of the database connection pools.",
+    dependencies=[Depends(require_admin)]
+)
+def database_status():
+    return database.pool_stats()
@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 
+import etags
 import handlers
-from dependencies import get_db, get_user_is_verified, get_user_is_admin
+import response_cache
+from dependencies import get_db, get_read_db, require_verified, require_admin
 from crud import subjects_crud
 import schemas
+import serializers
 
 router = APIRouter(
     prefix='/subjects',
     tags=['Subjects'],
-    dependencies=[Depends(get_db), Depends(get_user_is_verified)]
+    dependencies=[Depends(require_verified)]
 )
 
 
@@ -19,15 +23,20 @@ router = APIRouter(
     response_model=List[schemas.Subject],
     summary="Gets a list of all Subjects",
 )
-def get_subjects(database: Session = Depends(get_db)):
-    subjects = subjects_crud.get_all_subjects(database)
-    if subjects is None:
-        raise HTTPException(
-            status_code=404,
-            detail='Няма зададени предмети!'
-        )
+async def get_subjects(request: Request, response: Response,
+                       database: AsyncSession = Depends(get_read_db)):
+    tag = await etags.etag_async(database, etags.SUBJECTS)
+    not_modified = etags.not_modified(request, response, tag)
+    if not_modified is not None:
+        return not_modified
+    
+    async def build():
+        subjects = await subjects_crud.get_all_subjects_async(database)
+        return serializers.dump(schemas.Subject, subjects)
     
-    return subjects
+    return await response_cache.get_or_build(
+        database, ('get_subjects',), tag, (etags.SUBJECTS,), build
+    )
 
 
 @router.get(
@@ -35,8 +44,14 @@ def get_subjects(database: Session = Depends(get_db)):
     response_model=schemas.Subject,
     summary="Gets a Subject object from the DB.",
 )
-def get_subject(name: str, database: Session = Depends(get_db)):
-    subject = subjects_crud.get_subject_by_name(database, name)
+async def get_subject(name: str, request: Request, response: Response,
+                      database: AsyncSession = Depends(get_read_db)):
+    tag = await etags.etag_async(database, etags.SUBJECTS)
+    not_modified = etags.not_modified(request, response, tag)
+    if not_modified is not None:
+        return not_modified
+    
+    subject = await subjects_crud.get_subject_by_name_async(database, name)
     if subject is None:
         handlers.handle_subject_is_none(name)
     
@@ -46,7 +61,7 @@ def get_subject(name: str, database: Session = Depends(get_db)):
 @router.post(
     '/create',
     summary='Create a Subject instance in the DB.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def create_subject(subject: schemas.SubjectCreate,
                    database: Session = Depends(get_db)):
@@ -68,7 +83,7 @@ def create_subject(subject: schemas.SubjectCreate,
 @router.put(
     '/{name}/edit',
     summary='Edit the details of a Subject object from the DB.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def edit_subject(name: str, subject: schemas.SubjectCreate,
                  database: Session = Depends(get_db)):
@@ -92,7 +107,7 @@ def edit_subject(name: str, subject: schemas.SubjectCreate,
 @router.delete(
     '/{name}/delete',
     summary='Delete a Subject instance from the DB.',
-    dependencies=[Depends(get_user_is_admin)]
+    dependencies=[Depends(require_admin)]
 )
 def delete_subject(name: str, database: Session = Depends(get_db)):
     db_subject = subjects_crud.get_subject_by_name(database, name)
@@ -106,13 +121,9 @@ def delete_subject(name: str, database: Session = Depends(get_db)):
     response_model=List[schemas.Class],
     summary='Get a list of the Classes that are assigned to this Subject.'
 )
-def get_subject_classes(name: str, database: Session = Depends(get_db)):
-    subject = subjects_crud.get_subject_by_name(database, name)
+async def get_subject_classes(name: str,
+                              database: AsyncSession = Depends(get_read_db)):
+    subject = await subjects_crud.get_subject_by_name_async(database, name)
     if subject is None:
         handlers.handle_subject_is_none(name)
-    if subject.classes is None:
-        raise HTTPException(
-            status_code=404,
-            detail=f'Предметът не е зададен на никой Клас!'
-        )
-    return subject.classes
+    return await subjects_crud.get_subject_classes_async(database, subject)
@@ -1,19 +1,22 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from crud import users_crud
+import feeds
 import handlers
 import schemas
 import models
-from dependencies import get_db, get_current_user, get_user_is_verified, \
-    get_user_is_admin
+import serializers
+from dependencies import get_db, get_read_db, get_current_user, \
+    get_token_data, get_user_is_verified, require_verified, require_admin
 
 router = APIRouter(
     prefix='/users',
     tags=['Users'],
-    dependencies=[Depends(get_db), Depends(get_current_user)]
+    dependencies=[Depends(get_token_data)]
 )
 
 
@@ -21,17 +24,11 @@ router = APIRouter(
     '',
     response_model=List[schemas.UserWithClass],
     summary='Get the details of all User objects from the DB.',
-    dependencies=[Depends(get_user_is_verified)],
+    dependencies=[Depends(require_verified)],
 )
-def get_all_users(database: Session = Depends(get_db)):
-    users = users_crud.get_all_users(database)
-    if users is None:
-        raise HTTPException(
-            status_code=404,
-            detail='Няма създадени Потребители!'
-        )
-    
-    return users
+async def get_all_users(database: AsyncSession = Depends(get_read_db)):
+    users = await users_crud.get_all_users_async(database)
+    return serializers.respond(schemas.UserWithClass, users)
 
 
 @router.get(
@@ -43,6 +40,23 @@ def get_current_user(user: models.User = Depends(get_current_user)):
     return user
 
 
+@router.get(
+    '/me/feed',
+    summary='Stream the Messages created and deleted in the Subjects the '
+            'current User teaches, or in all of them for Admins, as '
+            'Server-Sent Events.',
+)
+def get_current_user_feed(
+        user: models.User = Depends(get_user_is_verified),
+        database: Session = Depends(get_db)
+):
+    topic = feeds.ALL if user.admin else feeds.teacher(user.id)
+    # The dependencies are only cleaned up when the stream ends, so the
+    # connection is given back to the pool now.
+    database.close()
+    return feeds.event_stream(topic)
+
+
 @router.put(
     '/me/edit',
     summary='Edit the details of the currently logged in User.'
@@ -88,10 +102,11 @@ def get_current_user(
     '/{email}',
     response_model=schemas.UserWithClass,
     summary='Get the details of a specific User by Email from the DB.',
-    dependencies=[Depends(get_user_is_verified)],
+    dependencies=[Depends(require_verified)],
 )
-def get_user_by_email(email: str, database: Session = Depends(get_db)):
-    user = users_crud.get_user_by_email(database, email)
+async def get_user_by_email(email: str,
+                            database: AsyncSession = Depends(get_read_db)):
+    user = await users_crud.get_user_by_email_async(database, email)
     if user is None:
         handlers.handle_user_is_none(email)
     return user
@@ -100,7 +115,7 @@ def get_user_by_email(email: str, database: Session = Depends(get_db)):
 @router.put(
     '/{email}/scope',
     summary='Change the scope of a given User.',
-    dependencies=[Depends(get_user_is_admin)],
+    dependencies=[Depends(require_admin)],
 )
 def edit_user_scope(email: str, scope: schemas.Scope,
                     database: Session = Depends(get_db)):
@@ -114,10 +129,13 @@ def edit_user_scope(email: str, scope: schemas.Scope,
     '/{email}/classes',
     summary='Get the Classes that the current Teacher teaches.',
     response_model=schemas.UserWithClasses,
-    dependencies=[Depends(get_user_is_verified)],
+    dependencies=[Depends(require_verified)],
 )
-def edit_user_scope(email: str, database: Session = Depends(get_db)):
-    db_user = users_crud.get_user_by_email(database, email)
+async def get_user_classes(email: str,
+                           database: AsyncSession = Depends(get_read_db)):
+    db_user = await users_crud.get_user_by_email_async(
+        database, email, schemas.UserWithClasses
+    )
     if db_user is None:
         handlers.handle_user_is_none(email)
     return db_user
@@ -1,4 +1,5 @@
 import datetime
+from enum import Enum
 from typing import Optional, List
 
 from pydantic import BaseModel
@@ -77,7 +78,11 @@ class Token(BaseModel):
 
 
 class TokenData(BaseModel):
-    email: Optional[str] = None
+    email: str
+    id: int
+    verified: bool
+    admin: bool
+    version: int
 
 
 class Scope(BaseModel):
@@ -145,7 +150,96 @@ class DiscordGuildId(BaseModel):
     guild_id: str
 
 
+# PROVISIONING SCHEMAS
+class ProvisioningClass(BaseModel):
+    name: str
+    class_teacher: Optional[str] = None
+
+
+class ProvisioningAssignment(BaseModel):
+    class_name: str
+    subject_name: str
+    teacher: Optional[str] = None
+
+
+class ProvisioningScope(BaseModel):
+    email: str
+    scope: Optional[str] = None
+
+
+class ProvisioningPlan(BaseModel):
+    classes: List[ProvisioningClass] = []
+    subjects: List[SubjectCreate] = []
+    assignments: List[ProvisioningAssignment] = []
+    scopes: List[ProvisioningScope] = []
+
+
+class ProvisioningResult(BaseModel):
+    classes: int
+    subjects: int
+    assignments: int
+    teachers: int
+    scopes: int
+
+
+class MessageSearchResult(BaseModel):
+    id: int
+    created_at: datetime.datetime
+    class_name: str
+    subject_name: str
+    title: str
+    # Escaped HTML of the best matching fragments of the text, with the
+    # matches in <mark> tags.
+    headline: str
+    rank: float
+    
+    class Config:
+        orm_mode = True
+
+
+# EXPORT SCHEMAS
+class ExportFormat(str, Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
+
+
+# ARCHIVE SCHEMAS
+class ArchivedTerm(BaseModel):
+    term: str
+    since: datetime.datetime
+    until: datetime.datetime
+    size: int
+
+
 # STATUS
 class Status(BaseModel):
     bot: bool
+    bot_checked_ago: Optional[float] = None
     servers: int
+
+
+class HashingStatus(BaseModel):
+    workers: int
+    concurrency: int
+    rounds: int
+    running: int
+    waiting: int
+
+
+class PoolStatus(BaseModel):
+    size: int
+    max_overflow: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    waiting: int
+    checkouts: int
+    failures: int
+    wait_total: float
+    wait_max: float
+
+
+class DatabaseStatus(BaseModel):
+    sync_engine: PoolStatus
+    async_engine: PoolStatus
+    replica_engine: Optional[PoolStatus] = None
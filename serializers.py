@@ -0,0 +1,115 @@
+from typing import Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+import schemas
+
+
+# Each function builds the same dict, with the same key order, as the
+# schema of the same name would from an ORM object, without validating it.
+def class_(obj):
+    return {
+        'guild_id': obj.guild_id,
+        'name': obj.name,
+        'id': obj.id,
+    }
+
+
+def subject(obj):
+    return {
+        'name': obj.name,
+        'id': obj.id,
+    }
+
+
+def user(obj):
+    return {
+        'first_name': obj.first_name,
+        'last_name': obj.last_name,
+        'email': obj.email,
+        'id': obj.id,
+        'verified': obj.verified,
+        'admin': obj.admin,
+    }
+
+
+def _optional(serializer, obj):
+    return serializer(obj) if obj is not None else None
+
+
+def class_with_user(obj):
+    return {
+        **class_(obj),
+        'class_teacher': _optional(user, obj.class_teacher),
+    }
+
+
+def user_with_class(obj):
+    return {
+        **user(obj),
+        'class_': _optional(class_, obj.class_),
+    }
+
+
+def user_with_classes(obj):
+    return {
+        **user(obj),
+        'classes': [class_(item) for item in obj.classes],
+    }
+
+
+def class_subject_with_user(obj):
+    return {
+        'subject': subject(obj.subject),
+        'teacher': _optional(user, obj.teacher),
+    }
+
+
+def message_with_user(obj):
+    return {
+        'title': obj.title,
+        'text': obj.text,
+        'id': obj.id,
+        'created_at': obj.created_at,
+        'user': user(obj.user),
+    }
+
+
+SERIALIZERS = {
+    schemas.Class: class_,
+    schemas.Subject: subject,
+    schemas.User: user,
+    schemas.ClassWithUser: class_with_user,
+    schemas.UserWithClass: user_with_class,
+    schemas.UserWithClasses: user_with_classes,
+    schemas.ClassSubjectsWithUser: class_subject_with_user,
+    schemas.MessageWithUser: message_with_user,
+}
+
+
+def serialize(schema, content):
+    """
+    Turns an ORM object, or a list of them, into the shape of the schema.
+    The relationships the schema reads should be loaded up front, see
+    crud/loading.py.
+    """
+    serializer = SERIALIZERS[schema]
+    if isinstance(content, list):
+        return [serializer(item) for item in content]
+    return serializer(content)
+
+
+def dump(schema, content) -> bytes:
+    return orjson.dumps(serialize(schema, content))
+
+
+def respond(schema, content,
+            response: Optional[Response] = None) -> ORJSONResponse:
+    """
+    Response for a route that skips the response_model validation. The
+    headers set on the route's `response` parameter are carried over.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return ORJSONResponse(serialize(schema, content), headers=headers)